@@ -0,0 +1,27 @@
+"""Add token_version to users
+
+Revision ID: f79f6d7b97c1
+Revises: 55783197bf47
+Create Date: 2026-10-18 09:30:12.418305+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f79f6d7b97c1'
+down_revision = '55783197bf47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+    # Workers periodically read the users changed within the token lifetime
+    op.create_index(op.f('ix_users_updated_at'), 'users', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_updated_at'), table_name='users')
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,42 @@
+"""Add user search indexes
+
+Revision ID: 3c1e9a4b7d20
+Revises: f79f6d7b97c1
+Create Date: 2026-10-18 14:00:41.902117+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1e9a4b7d20'
+down_revision = 'f79f6d7b97c1'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_users_username_trgm', 'USING gin (lower(username) gin_trgm_ops)'),
+    ('ix_users_email_trgm', 'USING gin (lower(email) gin_trgm_ops)'),
+    ('ix_users_username_prefix', '(lower(username) text_pattern_ops)'),
+    ('ix_users_email_prefix', '(lower(email) text_pattern_ops)'),
+]
+
+
+def upgrade() -> None:
+    # SQLite searches with a plain LIKE scan, there is nothing to index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CONCURRENTLY keeps the table writable while the indexes build, but
+    # cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users {definition}')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -1,34 +1,46 @@
+import math
 from datetime import timedelta
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import DBSession, get_db
 from app.core.config import settings
-from app.core.security import verify_password, create_access_token
+from app.core.login_guard import login_guard
+from app.core.security import verify_password_async, create_access_token, access_token_claims
 from app.repositories.user_repo import UserRepository
 from app.schemas.user import Token
-from app.utils.exceptions import UnauthorizedException, BadRequestException
+from app.utils.exceptions import UnauthorizedException, BadRequestException, TooManyRequestsException
 
 router = APIRouter()
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ):
     """OAuth2 compatible token login"""
+    client_ip = request.client.host if request.client else "unknown"
+    # Locked out callers never reach the database or the hashing pool
+    retry_after = await login_guard.retry_after(form_data.username, client_ip)
+    if retry_after:
+        raise TooManyRequestsException("Too many failed login attempts", retry_after=math.ceil(retry_after))
+    
     user_repo = UserRepository(db)
-    user = user_repo.get_by_username(form_data.username)
+    user = await user_repo.get_by_username(form_data.username)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        await login_guard.dummy_verify(form_data.password)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
+        await login_guard.record_failure(form_data.username, client_ip)
         raise UnauthorizedException("Incorrect username or password")
+    await login_guard.record_success(form_data.username)
     
     if not user.is_active:
         raise BadRequestException("Inactive user")
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, 
+        data=access_token_claims(user),
         expires_delta=access_token_expires
     )
     
@@ -1,68 +1,196 @@
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
-from app.core.dependencies import get_current_active_user, get_current_superuser
-from app.schemas.user import UserCreate, UserUpdate, UserResponse
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Any, Callable, List, Literal, Optional
+from app.core.config import settings
+from app.core.database import DBSession, get_db, get_session_scope
+from app.core.security import Principal
+from app.core.dependencies import get_current_active_user, get_current_active_db_user, get_current_superuser
+from app.schemas.user import (
+    UserCreate, UserUpdate, UserResponse, UserResponseBatch, UserPage, UserImportReport
+)
 from app.services.user_service import UserService
 from app.models.user import User
+from app.utils.exceptions import BadRequestException
+from app.utils.etag import make_etag
+from app.utils.responses import ModelResponse, conditional_response
+from app.utils.streaming import iter_csv_records, iter_ndjson_records
 
 router = APIRouter()
 
+# ?total= on list endpoints: omitted skips counting, "estimated" uses planner statistics
+TotalMode = Optional[Literal["exact", "estimated"]]
+TOTAL_QUERY = Query(None, description="Also return the total number of users (X-Total-Count)")
+
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(
+async def create_user(
     user_create: UserCreate,
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ):
     """Create new user"""
     service = UserService(db)
-    return service.create_user(user_create)
+    user = await service.create_user(user_create)
+    return ModelResponse(user, status_code=status.HTTP_201_CREATED)
+
+@router.post(
+    "/import",
+    response_model=UserImportReport,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_users(
+    request: Request,
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_superuser)
+):
+    """Bulk import users from NDJSON or CSV (superuser only)"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "text/csv":
+        records = iter_csv_records(request.stream(), settings.BULK_IMPORT_MAX_LINE_BYTES)
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        records = iter_ndjson_records(request.stream(), settings.BULK_IMPORT_MAX_LINE_BYTES)
+    else:
+        raise BadRequestException("Content-Type must be application/x-ndjson or text/csv")
+    
+    service = UserService(db)
+    return await service.import_users(records)
 
-@router.get("/me", response_model=UserResponse)
-def read_current_user(
-    current_user: User = Depends(get_current_active_user)
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+async def export_users(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    session_scope: Callable[[], Any] = Depends(get_session_scope),
+    current_user: Principal = Depends(get_current_superuser)
+):
+    """Stream all users as NDJSON or CSV (superuser only)"""
+    async def body():
+        # The request-scoped session is closed before the body is sent
+        async with session_scope() as db:
+            async for chunk in UserService(db).export_users(format):
+                yield chunk
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
+@router.get("/me", response_model=UserResponse, responses={304: {"description": "Not modified"}})
+async def read_current_user(
+    request: Request,
+    current_user: User = Depends(get_current_active_db_user)
 ):
     """Get current user"""
-    return current_user
+    etag = make_etag(current_user.id, current_user.updated_at)
+    return conditional_response(request, etag, lambda: UserResponse.model_validate(current_user))
+
+@router.get("/page", response_model=UserPage)
+async def read_users_page(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.MAX_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    total: TotalMode = TOTAL_QUERY,
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_superuser)
+):
+    """Get users with cursor pagination (superuser only)"""
+    service = UserService(db)
+    page = await service.get_users_page(cursor=cursor, limit=limit, total=total)
+    headers = {"X-Total-Count": str(page.total)} if page.total is not None else None
+    return ModelResponse(page, headers=headers)
+
+@router.get("/search", response_model=UserPage)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=settings.USER_SEARCH_MAX_QUERY_LENGTH),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=settings.MAX_PAGE_SIZE),
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_superuser)
+):
+    """Search users by username or email prefix or substring, best match first
+    (superuser only)"""
+    service = UserService(db)
+    return ModelResponse(await service.search_users(q, cursor=cursor, limit=limit))
+
+def parse_ids(values: List[str]) -> List[int]:
+    """Ids from ``ids=1,2,3`` and/or repeated ``ids=1&ids=2``"""
+    try:
+        return [int(part) for value in values for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise BadRequestException("ids must be integers")
+
+@router.get("/batch", response_model=List[Optional[UserResponse]])
+async def read_users_batch(
+    ids: List[str] = Query(..., description="Comma separated user ids, e.g. ids=3,1,2"),
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """Get several users by id in one query; results follow the order of ``ids``,
+    with null for unknown ids"""
+    user_ids = parse_ids(ids)
+    if not user_ids:
+        raise BadRequestException("ids is empty")
+    if len(user_ids) > settings.MAX_BATCH_IDS:
+        raise BadRequestException(f"At most {settings.MAX_BATCH_IDS} ids per request")
+    service = UserService(db)
+    return ModelResponse(await service.get_users_by_ids(user_ids), adapter=UserResponseBatch)
 
-@router.get("/{user_id}", response_model=UserResponse)
-def read_user(
+@router.get("/{user_id}", response_model=UserResponse, responses={304: {"description": "Not modified"}})
+async def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Get user by ID"""
     service = UserService(db)
-    return service.get_user(user_id)
+    body, etag = await service.get_user_json(user_id)
+    return conditional_response(request, etag, lambda: body)
 
 @router.get("/", response_model=List[UserResponse])
-def read_users(
+async def read_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)
+    total: TotalMode = TOTAL_QUERY,
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_superuser)
 ):
     """Get all users (superuser only)"""
     service = UserService(db)
-    return service.get_users(skip=skip, limit=limit)
+    body = await service.get_users_json(skip=skip, limit=min(limit, settings.MAX_PAGE_SIZE))
+    headers = {"X-Total-Count": str(await service.count_users(total))} if total else None
+    return Response(body, media_type="application/json", headers=headers)
 
-@router.put("/{user_id}", response_model=UserResponse)
-def update_user(
+@router.put("/{user_id}", response_model=UserResponse, responses={412: {"description": "If-Match ETag is stale"}})
+async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    if_match: Optional[str] = Header(None),
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    """Update user"""
+    """Update user; send If-Match with the user's ETag to reject lost updates"""
     service = UserService(db)
-    return service.update_user(user_id, user_update)
+    user = await service.update_user(user_id, user_update, if_match=if_match)
+    return ModelResponse(
+        UserResponse.model_validate(user), headers={"ETag": make_etag(user.id, user.updated_at)}
+    )
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(
+async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)
+    db: DBSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_superuser)
 ):
     """Delete user (superuser only)"""
     service = UserService(db)
-    service.delete_user(user_id)
+    await service.delete_user(user_id)
@@ -1,19 +1,62 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 class Settings(BaseSettings):
     # App
     PROJECT_NAME: str = "FastAPI Production App"
     VERSION: str = "1.0.0"
     API_V1_STR: str = "/api/v1"
+    MAX_PAGE_SIZE: int = 100
+    # Most ids accepted by GET /users/batch
+    MAX_BATCH_IDS: int = 100
+    # GET /users/search: shorter queries only match prefixes, trigram indexes
+    # cannot serve substrings of fewer than 3 characters
+    USER_SEARCH_MIN_SUBSTRING_LENGTH: int = 3
+    USER_SEARCH_MAX_QUERY_LENGTH: int = 100
     ENVIRONMENT: str = "production"
     
     # Security
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Dedicated bcrypt pool; workers default to the CPU count
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    # Sign uid, is_active, is_superuser and token_version into access tokens so
+    # authorization needs no user lookup; revocation goes through token_version
+    JWT_CLAIMS_MODE: bool = False
+    TOKEN_REVOCATION_REFRESH_SECONDS: float = 30.0
+    
+    # Bulk user import
+    BULK_IMPORT_BATCH_SIZE: int = 500
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    # Longer lines are reported as errors and skipped, bounding memory per upload
+    BULK_IMPORT_MAX_LINE_BYTES: int = 64 * 1024
+    BULK_IMPORT_HASH_EXECUTOR: Literal["thread", "process"] = "process"
+    BULK_IMPORT_HASH_WORKERS: Optional[int] = None
+    # Rows fetched per server-side cursor round trip by the export
+    EXPORT_BATCH_SIZE: int = 1000
     
     # Database
     DATABASE_URL: str
+    # "sync" runs queries on the threadpool, "async" uses asyncpg/aiosqlite
+    DATABASE_MODE: Literal["sync", "async"] = "sync"
+    # Startup schema handling: "create_all" for development; "check" only compares
+    # alembic_version with the head revision (once per gunicorn master) and fails fast
+    DB_SCHEMA_STARTUP: Literal["create_all", "check", "none"] = "create_all"
+    # Per worker process: keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below max_connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_USE_LIFO: bool = True
+    # Ping on every checkout, or (cheaper) only connections idle longer than DB_POOL_PING_IDLE_SECONDS
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_PING_IDLE_SECONDS: Optional[float] = 30.0
+    # Optional read replicas; reads fall back to the primary when none is healthy
+    DATABASE_REPLICA_URLS: list = []
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DATABASE_REPLICA_CHECK_INTERVAL_SECONDS: float = 5.0
     
     # CORS
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000"]
@@ -21,6 +64,55 @@ class Settings(BaseSettings):
     # Redis (optional)
     REDIS_URL: Optional[str] = None
     
+    # Rate limiting
+    RATE_LIMIT_PER_MINUTE: int = 100
+    RATE_LIMIT_ALGORITHM: Literal["sliding_window", "token_bucket"] = "sliding_window"
+    # "shared_memory" shares counts between workers on one host, "redis" across hosts
+    RATE_LIMIT_BACKEND: Literal["memory", "shared_memory", "redis"] = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # Prefix of the shared memory segment and lock file; gunicorn.conf.py makes
+    # it unique per master so deployments on one host never share counts
+    RATE_LIMIT_SHM_NAME: str = "fastapi-rate-limit"
+    
+    # Login lockouts, checked before the user lookup and bcrypt (Redis when REDIS_URL is set)
+    LOGIN_GUARD_ENABLED: bool = True
+    LOGIN_GUARD_USERNAME_THRESHOLD: int = 5
+    LOGIN_GUARD_IP_THRESHOLD: int = 20
+    # Each failure from the threshold on locks for base * 2**(failures - threshold), capped
+    LOGIN_GUARD_BASE_LOCKOUT_SECONDS: float = 1.0
+    LOGIN_GUARD_MAX_LOCKOUT_SECONDS: float = 900.0
+    # Failures are forgotten this long after the last one
+    LOGIN_GUARD_WINDOW_SECONDS: float = 900.0
+    LOGIN_GUARD_MAX_KEYS: int = 100_000
+    # Dummy verifies per second for unknown usernames; past it they sleep instead of hashing
+    LOGIN_DUMMY_VERIFY_PER_SECOND: float = 5.0
+    
+    # Authenticated user cache (L2 uses REDIS_URL when set)
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 10.0
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10_000
+    PRINCIPAL_CACHE_REDIS_TTL_SECONDS: int = 300
+    
+    # Read-through cache of serialized user responses, shared through REDIS_URL
+    USER_CACHE_ENABLED: bool = True
+    # Without REDIS_URL, cache in-process instead; only coherent with a single worker
+    USER_CACHE_LOCAL: bool = False
+    USER_CACHE_TTL_SECONDS: int = 60
+    # Entries this close to expiry are refreshed by one request while others keep reading them
+    USER_CACHE_REFRESH_AHEAD_SECONDS: float = 5.0
+    USER_CACHE_LOCK_TIMEOUT_SECONDS: float = 2.0
+    # Concurrent identical reads in one process share a single DB call (keeps no data)
+    SINGLE_FLIGHT_ENABLED: bool = True
+    
+    # Metrics
+    METRICS_ENABLED: bool = True
+    
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    # Fraction of 2xx responses written to the access log; other statuses are always logged
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,14 +1,264 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Union
+import time
 from app.core.config import settings
+from app.core.metrics import DB_POOL_PINGS, instrument_engine, instrumented_pool_class
+from app.core.replicas import ReplicaSet, RoutingSession
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async drivers used when DATABASE_MODE is "async"
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
+def get_async_database_url(url: str) -> str:
+    """Swap the sync driver of a database URL for its async counterpart"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def default_pool_class(url: str, label: str = "primary") -> Any:
+    """The pool class the dialect would pick, wrapped to record checkout waits"""
+    parsed = make_url(url)
+    return instrumented_pool_class(parsed.get_dialect().get_pool_class(parsed), label)
+
+def engine_options(url: str, label: str = "primary") -> Dict[str, Any]:
+    """create_engine keyword arguments for the configured pool.
+
+    Sizing options only apply to QueuePool and its async variant; SQLite's
+    in-memory and file pools reject them.
+    """
+    poolclass = default_pool_class(url, label)
+    options: Dict[str, Any] = {"poolclass": poolclass, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if issubclass(poolclass, QueuePool):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_use_lifo=settings.DB_POOL_USE_LIFO,
+        )
+    return options
+
+def enable_idle_ping(engine: Engine, idle_seconds: float, label: str = "primary") -> None:
+    """Ping a pooled connection on checkout only if it sat idle for ``idle_seconds``.
+
+    Connections in steady use skip the extra round trip that pool_pre_ping
+    costs on every checkout. A failed ping raises DisconnectionError, which
+    makes the pool discard the connection and retry with a fresh one.
+    """
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        # Absent for brand-new connections; cleared when a connection is replaced
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as exc:
+            DB_POOL_PINGS.labels(label, "failed").inc()
+            raise DisconnectionError("Idle connection failed liveness ping") from exc
+        DB_POOL_PINGS.labels(label, "ok").inc()
+
+def configure_engine(engine: Engine, label: str = "primary") -> None:
+    # The ping goes first: checkout listeners run in registration order, so a
+    # failed ping stops the attempt before it is counted as checked out (the
+    # retry with a fresh connection is counted, and checked in, as usual)
+    if not settings.DB_POOL_PRE_PING and settings.DB_POOL_PING_IDLE_SECONDS is not None:
+        enable_idle_ping(engine, settings.DB_POOL_PING_IDLE_SECONDS, label)
+    instrument_engine(engine, label)
+
+def create_mode_engine(url: str, label: str) -> Union[Engine, AsyncEngine]:
+    """Instrumented engine for DATABASE_MODE, used for the replicas"""
+    if settings.DATABASE_MODE == "async":
+        async_url = get_async_database_url(url)
+        replica_engine = create_async_engine(async_url, **engine_options(async_url, label))
+        configure_engine(replica_engine.sync_engine, label)
+        return replica_engine
+    replica_engine = create_engine(url, **engine_options(url, label))
+    configure_engine(replica_engine, label)
+    return replica_engine
+
+# Created by init_engines(), in each worker process: nothing here may hold a
+# connection while gunicorn forks (see gunicorn.conf.py, preload_app)
+engine: Optional[Engine] = None
+SessionLocal: Optional[sessionmaker[Session]] = None
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
+replica_set: Optional[ReplicaSet] = None
+
+def init_engines() -> None:
+    """Create the engines and session factories; a no-op once they exist"""
+    global engine, SessionLocal, async_engine, AsyncSessionLocal, replica_set
+    if engine is not None:
+        return
+    
+    if settings.DATABASE_REPLICA_URLS:
+        replica_set = ReplicaSet(
+            [create_mode_engine(url, f"replica-{i}") for i, url in enumerate(settings.DATABASE_REPLICA_URLS)],
+            max_lag=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+        )
+    
+    # In async mode this engine only serves the sync session factory, with its
+    # own pool, so it is reported separately from the async one
+    sync_label = "primary-sync" if settings.DATABASE_MODE == "async" else "primary"
+    engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, sync_label))
+    configure_engine(engine, sync_label)
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, replicas=replica_set
+    )
+    
+    if settings.DATABASE_MODE == "async":
+        async_url = get_async_database_url(settings.DATABASE_URL)
+        async_engine = create_async_engine(async_url, **engine_options(async_url))
+        AsyncSessionLocal = async_sessionmaker(
+            async_engine,
+            sync_session_class=RoutingSession,
+            autoflush=False,
+            expire_on_commit=False,
+            replicas=replica_set,
+        )
+        configure_engine(async_engine.sync_engine)
+
+def _sync_engines() -> List[Engine]:
+    engines = [engine] if engine is not None else []
+    if async_engine is not None:
+        engines.append(async_engine.sync_engine)
+    if replica_set is not None:
+        engines.extend(replica.bind for replica in replica_set.replicas)
+    return engines
+
+def dispose_inherited_pools() -> None:
+    """Drop pooled connections inherited from the parent; call right after fork.
+    
+    ``close=False`` leaves the sockets alone so the parent's connections are
+    not shut down from the child.
+    """
+    for sync_engine in _sync_engines():
+        sync_engine.dispose(close=False)
+
+async def dispose_engines() -> None:
+    global engine, SessionLocal, async_engine, AsyncSessionLocal, replica_set
+    if replica_set is not None:
+        await replica_set.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+    engine = SessionLocal = async_engine = AsyncSessionLocal = replica_set = None
+
+
+class SyncResultAdapter:
+    """Async iteration over a streaming sync Result, fetching each partition in the threadpool"""
+
+    def __init__(self, result: Any):
+        self._result = result
+
+    async def partitions(self, size: Optional[int] = None) -> AsyncIterator[List[Any]]:
+        partitions = self._result.partitions(size)
+        while True:
+            partition = await run_in_threadpool(next, partitions, None)
+            if partition is None:
+                break
+            yield partition
+
+
+class SyncSessionAdapter:
+    """Expose a sync Session through the subset of the AsyncSession API used by
+    the repositories, running each database round trip in the threadpool.
+
+    This lets the same async repository code run on either engine, so the
+    sync and async modes can be benchmarked against each other.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def scalars(self, *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(self.sync_session.scalars, *args, **kwargs)
+
+    async def stream(self, statement: Any, **kwargs: Any) -> SyncResultAdapter:
+        statement = statement.execution_options(stream_results=True)
+        result = await run_in_threadpool(self.sync_session.execute, statement, **kwargs)
+        return SyncResultAdapter(result)
+
+    async def get(self, *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    def get_bind(self, *args: Any, **kwargs: Any) -> Any:
+        return self.sync_session.get_bind(*args, **kwargs)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def delete(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+# Session type handed to repositories in either mode
+DBSession = Union[AsyncSession, SyncSessionAdapter]
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[DBSession]:
+    # Scripts and tests run without the app lifespan
+    init_engines()
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    db = SyncSessionAdapter(SessionLocal())
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+@asynccontextmanager
+async def primary_session_scope() -> AsyncIterator[DBSession]:
+    """session_scope pinned to the primary, for reads that must not lag behind writes"""
+    async with session_scope() as db:
+        db.sync_session.wrote = True
+        yield db
+
+async def get_db() -> AsyncGenerator[DBSession, None]:
+    async with session_scope() as db:
+        yield db
+
+def get_session_scope() -> Callable[[], Any]:
+    """Session factory for work that outlives the endpoint, such as streaming
+    response bodies: dependencies with yield are closed before the body is sent"""
+    return session_scope
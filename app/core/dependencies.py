@@ -1,8 +1,12 @@
+from contextlib import nullcontext
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import decode_access_token
+from app.core.config import settings
+from app.core.database import DBSession, get_db
+from app.core.principal_cache import principal_cache
+from app.core.replicas import primary_reads
+from app.core.security import Principal, decode_access_claims
+from app.core.token_revocation import token_revocations
 from app.repositories.user_repo import UserRepository
 from app.models.user import User
 from app.utils.exceptions import UnauthorizedException, BadRequestException, ForbiddenException
@@ -11,30 +15,72 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_db)
 ) -> User:
-    username = decode_access_token(token)
+    """The full user row of the token's owner"""
+    claims = decode_access_claims(token)
+    username = claims.get("sub") if claims else None
     if username is None:
         raise UnauthorizedException("Could not validate credentials")
     
-    user_repo = UserRepository(db)
-    user = user_repo.get_by_username(username)
+    user = None
+    if settings.PRINCIPAL_CACHE_ENABLED:
+        user = await principal_cache.get(username)
     
     if user is None:
-        raise UnauthorizedException("Could not validate credentials")
+        user_repo = UserRepository(db)
+        # A lagging replica could return the row as it was before the write
+        # that just invalidated the cache, and the cache would keep it
+        with primary_reads(db) if settings.PRINCIPAL_CACHE_ENABLED else nullcontext():
+            user = await user_repo.get_by_username(username)
+        
+        if user is None:
+            raise UnauthorizedException("Could not validate credentials")
+        
+        if settings.PRINCIPAL_CACHE_ENABLED:
+            await principal_cache.set(user)
     
+    # Tokens signed with claims are revoked by bumping the user's token_version
+    if "token_version" in claims and claims["token_version"] < (user.token_version or 0):
+        raise UnauthorizedException("Token has been revoked")
     return user
 
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: DBSession = Depends(get_db)
+) -> Principal:
+    """Who is calling; read from the token alone in JWT_CLAIMS_MODE"""
+    if settings.JWT_CLAIMS_MODE:
+        claims = decode_access_claims(token)
+        if claims is None:
+            raise UnauthorizedException("Could not validate credentials")
+        principal = Principal.from_claims(claims)
+        # Tokens issued before claims mode was enabled go through the user lookup
+        if principal is not None:
+            if token_revocations.is_revoked(principal.id, principal.token_version):
+                raise UnauthorizedException("Token has been revoked")
+            return principal
+    
+    return Principal.from_user(await get_current_user(token, db))
+
 async def get_current_active_user(
+    current_user: Principal = Depends(get_current_principal)
+) -> Principal:
+    if not current_user.is_active:
+        raise BadRequestException("Inactive user")
+    return current_user
+
+async def get_current_active_db_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
+    """Like get_current_active_user, for endpoints that need the whole row"""
     if not current_user.is_active:
         raise BadRequestException("Inactive user")
     return current_user
 
 async def get_current_superuser(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_principal)
+) -> Principal:
     if not current_user.is_superuser:
         raise ForbiddenException("The user doesn't have enough privileges")
-    return current_user
\ No newline at end of file
+    return current_user
@@ -0,0 +1,208 @@
+"""Login throttling checked before the user lookup and bcrypt.
+
+Failed logins are counted per username and per client IP. Once a key has
+reached its threshold, every further failure locks it for an exponentially
+growing window (base * 2**n, capped), and logins for a locked username or
+from a locked IP are rejected with 429 before the database or the hashing
+pool is touched. Counters are forgotten LOGIN_GUARD_WINDOW_SECONDS after the
+last failure; a successful login clears its username but not its IP.
+
+Unknown usernames still cost one bcrypt verify against a dummy hash, so
+response times do not reveal which accounts exist. Those verifies are
+budgeted per process: past the budget the request sleeps for the usual
+verify time instead of hashing.
+
+State lives in Redis when REDIS_URL is set (shared by every worker and
+host), otherwise in a bounded per-process map.
+"""
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+from typing import Any, Optional, Sequence, Tuple
+from app.core import metrics, security
+from app.core.config import settings
+from app.core.rate_limit import TokenBucket
+from app.core.redis import FakeRedis, get_redis
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# (failures, locked_until)
+State = Tuple[int, float]
+
+RECORD_FAILURE_LUA = """
+local threshold = tonumber(ARGV[1])
+local base = tonumber(ARGV[2])
+local cap = tonumber(ARGV[3])
+local window = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local failures = redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+if failures >= threshold then
+    local lockout = math.min(cap, base * 2 ^ (failures - threshold))
+    redis.call('SET', KEYS[2], tostring(now + lockout), 'PX', math.ceil(lockout * 1000))
+end
+return failures
+"""
+
+
+def lockout_seconds(failures: int, threshold: int, base: float, cap: float) -> float:
+    """Lockout after the given number of consecutive failures, 0 below the threshold"""
+    if failures < threshold:
+        return 0.0
+    return min(cap, base * 2 ** (failures - threshold))
+
+
+@FakeRedis.emulate(RECORD_FAILURE_LUA)
+def _record_failure_emulation(redis: FakeRedis, keys: Sequence[str], args: Sequence[Any]) -> int:
+    threshold, base, cap, window, now = int(args[0]), float(args[1]), float(args[2]), float(args[3]), float(args[4])
+    failures = int(redis.load(keys[0]) or 0) + 1
+    redis.store(keys[0], str(failures).encode(), window)
+    lockout = lockout_seconds(failures, threshold, base, cap)
+    if lockout:
+        redis.store(keys[1], str(now + lockout).encode(), lockout)
+    return failures
+
+
+class LoginGuard:
+    def __init__(
+        self,
+        redis: Any = None,
+        username_threshold: int = 5,
+        ip_threshold: int = 20,
+        base_lockout: float = 1.0,
+        max_lockout: float = 900.0,
+        window: float = 900.0,
+        max_keys: int = 100_000,
+        dummy_verify_per_second: float = 5.0,
+        enabled: bool = True,
+        prefix: str = "login",
+    ):
+        self.redis = redis
+        self.thresholds = {"username": username_threshold, "ip": ip_threshold}
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.window = window
+        self.enabled = enabled
+        self.prefix = prefix
+        # Attackers choose the usernames, so the in-process map must stay bounded
+        self.local: TTLCache[State] = TTLCache(maxsize=max_keys, ttl=window)
+        self._script = redis.register_script(RECORD_FAILURE_LUA) if redis is not None else None
+        self.dummy_budget = TokenBucket(max(1, round(dummy_verify_per_second)), 1.0)
+        self._budget_state = self.dummy_budget.initial(time.monotonic())
+        self._dummy_hash: Optional[str] = None
+        self.stats = {"rejected": 0, "failures": 0, "dummy_verifies": 0, "dummy_sleeps": 0}
+
+    def _keys(self, username: str, ip: str) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+        # Hashed: usernames are arbitrary client input
+        digest = hashlib.sha256(username.encode()).hexdigest()[:32]
+        return ("username", f"user:{digest}"), ("ip", f"ip:{ip}")
+
+    async def retry_after(self, username: str, ip: str) -> float:
+        """Seconds until a login for ``username`` from ``ip`` is allowed, 0 if it is"""
+        if not self.enabled:
+            return 0.0
+        now = time.time()
+        for scope, key in self._keys(username, ip):
+            locked_until = await self._locked_until(key)
+            if locked_until > now:
+                self._skipped("locked")
+                self.stats["rejected"] += 1
+                metrics.LOGIN_GUARD_REJECTIONS.labels(scope).inc()
+                return locked_until - now
+        return 0.0
+
+    async def _locked_until(self, key: str) -> float:
+        if self.redis is None:
+            state = self.local.get(key)
+            return state[1] if state else 0.0
+        try:
+            raw = await self.redis.get(f"{self.prefix}:{key}:lock")
+        except Exception:
+            # Fail open: an unreachable Redis must not lock everyone out
+            logger.exception("Login guard read failed")
+            return 0.0
+        return float(raw) if raw is not None else 0.0
+
+    async def record_failure(self, username: str, ip: str) -> None:
+        if not self.enabled:
+            return
+        self.stats["failures"] += 1
+        now = time.time()
+        for scope, key in self._keys(username, ip):
+            threshold = self.thresholds[scope]
+            if self._script is None:
+                failures = (self.local.get(key) or (0, 0.0))[0] + 1
+                lockout = lockout_seconds(failures, threshold, self.base_lockout, self.max_lockout)
+                self.local.set(key, (failures, now + lockout if lockout else 0.0), ttl=lockout + self.window)
+                continue
+            try:
+                await self._script(
+                    keys=[f"{self.prefix}:{key}", f"{self.prefix}:{key}:lock"],
+                    args=[threshold, self.base_lockout, self.max_lockout, self.window, now],
+                )
+            except Exception:
+                logger.exception("Login guard write failed")
+
+    async def record_success(self, username: str) -> None:
+        if not self.enabled:
+            return
+        (_, key), _ = self._keys(username, "")
+        if self.redis is None:
+            self.local.delete(key)
+            return
+        try:
+            await self.redis.delete(f"{self.prefix}:{key}", f"{self.prefix}:{key}:lock")
+        except Exception:
+            logger.exception("Login guard write failed")
+
+    async def warm_up(self) -> None:
+        """Create the dummy hash and time one verify, so the padding sleep is
+        right from the first request; a no-op once done in this process"""
+        if self._dummy_hash is None or not security.verify_seconds:
+            await self._verify_dummy(secrets.token_urlsafe(16))
+    
+    async def _verify_dummy(self, password: str) -> None:
+        if self._dummy_hash is None:
+            self._dummy_hash = await security.get_password_hash_async(secrets.token_urlsafe(16))
+        await security.verify_password_async(password, self._dummy_hash)
+    
+    async def dummy_verify(self, password: str) -> None:
+        """Spend about as long as verifying a real user's password, for unknown users"""
+        allowed, self._budget_state, _ = self.dummy_budget.apply(self._budget_state, time.monotonic())
+        # Until a verify has been timed there is nothing to imitate
+        if allowed or not security.verify_seconds:
+            self.stats["dummy_verifies"] += 1
+            await self._verify_dummy(password)
+            return
+        # Over budget: same latency without the CPU
+        self.stats["dummy_sleeps"] += 1
+        self._skipped("unknown_user")
+        await asyncio.sleep(security.verify_seconds)
+
+    @staticmethod
+    def _skipped(reason: str) -> None:
+        metrics.PASSWORD_VERIFY_SKIPPED.labels(reason).inc()
+        metrics.PASSWORD_VERIFY_SECONDS_SAVED.labels(reason).inc(security.verify_seconds)
+
+    def clear(self) -> None:
+        """Reset the in-process state (a shared Redis is left alone)"""
+        self.local.clear()
+        self._budget_state = self.dummy_budget.initial(time.monotonic())
+        if isinstance(self.redis, FakeRedis):
+            self.redis.flushall()
+
+
+login_guard = LoginGuard(
+    redis=get_redis(),
+    username_threshold=settings.LOGIN_GUARD_USERNAME_THRESHOLD,
+    ip_threshold=settings.LOGIN_GUARD_IP_THRESHOLD,
+    base_lockout=settings.LOGIN_GUARD_BASE_LOCKOUT_SECONDS,
+    max_lockout=settings.LOGIN_GUARD_MAX_LOCKOUT_SECONDS,
+    window=settings.LOGIN_GUARD_WINDOW_SECONDS,
+    max_keys=settings.LOGIN_GUARD_MAX_KEYS,
+    dummy_verify_per_second=settings.LOGIN_DUMMY_VERIFY_PER_SECOND,
+    enabled=settings.LOGIN_GUARD_ENABLED,
+)
@@ -0,0 +1,205 @@
+"""Prometheus metrics shared by the middleware, database, security and cache layers.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py): every
+worker then writes its samples to files in that directory and /metrics
+aggregates all live workers.
+"""
+import os
+import time
+from typing import Any, Type
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size", "Configured connection pool size", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond the pool size", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_waiting", "Callers waiting for a connection", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent obtaining a connection from the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CONNECTIONS_CREATED = Counter(
+    "db_pool_connections_created_total", "New DBAPI connections opened by the pool", ["pool"]
+)
+DB_POOL_INVALIDATIONS = Counter(
+    "db_pool_invalidations_total", "Pooled connections invalidated", ["pool"]
+)
+DB_POOL_PINGS = Counter(
+    "db_pool_pings_total", "Liveness pings of idle pooled connections", ["pool", "result"]
+)
+DB_REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy", "1 if the replica passed its last health check", ["replica"],
+    multiprocess_mode="min",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Replication lag seen by the last health check", ["replica"],
+    multiprocess_mode="max",
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt run time on the hashing pool",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2.5, 5, 10),
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time bcrypt calls waited for a hashing worker",
+    ["operation"],
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "bcrypt calls waiting for a hashing worker",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTIONS = Counter(
+    "password_hash_rejections_total", "bcrypt calls rejected because the queue was full"
+)
+
+LOGIN_GUARD_REJECTIONS = Counter(
+    "login_guard_rejections_total",
+    "Logins rejected by a username or IP lockout before the user lookup",
+    ["scope"],
+)
+PASSWORD_VERIFY_SKIPPED = Counter(
+    "password_verify_skipped_total",
+    "bcrypt verifies not run: 'locked' logins, 'unknown_user' past the dummy verify budget",
+    ["reason"],
+)
+PASSWORD_VERIFY_SECONDS_SAVED = Counter(
+    "password_verify_seconds_saved_total",
+    "Hashing pool time not spent on skipped verifies, at the typical verify run time",
+    ["reason"],
+)
+
+JWT_DECODE_DURATION = Histogram(
+    "jwt_decode_duration_seconds",
+    "Access token decode and verification time",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter"
+)
+
+PRINCIPAL_CACHE_LOOKUPS = Counter(
+    "principal_cache_lookups_total",
+    "Authenticated user cache lookups",
+    ["result"],
+)
+
+USER_CACHE_LOOKUPS = Counter(
+    "user_cache_lookups_total",
+    "User response cache lookups",
+    ["result"],
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Coalesced reads: 'leader' ran the call, 'shared' joined one already in flight",
+    ["name", "result"],
+)
+
+
+def instrumented_pool_class(base: Type[Any], label: str = "primary") -> Type[Any]:
+    """Subclass a pool class so the time spent waiting in ``_do_get`` is recorded.
+
+    SQLAlchemy has no event before a checkout starts, so this is the only
+    place the wait for a free connection can be measured. A subclass (rather
+    than a patched instance) survives ``engine.dispose()``, which recreates
+    the pool from its class.
+    """
+
+    class InstrumentedPool(base):  # type: ignore[misc, valid-type]
+        metrics_label = label
+
+        def _do_get(self) -> Any:
+            waiting = DB_POOL_WAITING.labels(self.metrics_label)
+            waiting.inc()
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                waiting.dec()
+                DB_POOL_CHECKOUT_WAIT.labels(self.metrics_label).observe(time.perf_counter() - start)
+
+    InstrumentedPool.__name__ = InstrumentedPool.__qualname__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+def instrument_engine(engine: Engine, label: str = "primary") -> None:
+    """Track pool occupancy, new connections and invalidations of a (sync) engine"""
+    if isinstance(engine.pool, QueuePool):
+        DB_POOL_SIZE.labels(label).set(engine.pool.size())
+    checked_out = DB_POOL_CHECKED_OUT.labels(label)
+    overflow = DB_POOL_OVERFLOW.labels(label)
+    created = DB_POOL_CONNECTIONS_CREATED.labels(label)
+    invalidations = DB_POOL_INVALIDATIONS.labels(label)
+
+    def _record_overflow() -> None:
+        if isinstance(engine.pool, QueuePool):
+            overflow.set(max(0, engine.pool.overflow()))
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection: Any, connection_record: Any, connection_proxy: Any) -> None:
+        checked_out.inc()
+        _record_overflow()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        checked_out.dec()
+        _record_overflow()
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        created.inc()
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection: Any, connection_record: Any, exception: Any) -> None:
+        invalidations.inc()
+
+    @event.listens_for(engine, "soft_invalidate")
+    def _on_soft_invalidate(dbapi_connection: Any, connection_record: Any, exception: Any) -> None:
+        invalidations.inc()
+
+
+def render_metrics() -> tuple:
+    """Exposition payload and content type, aggregated across workers when multiprocess"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,99 @@
+"""Cache of authenticated users so protected routes can skip the user lookup.
+
+L1 is a per-process LRU/TTL map; L2 is Redis when REDIS_URL is configured.
+Entries are invalidated explicitly by ``UserRepository.update``/``delete``.
+Other workers only drop their L1 copy when it expires, so the L1 TTL bounds
+how long a change made through another worker can go unnoticed.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.core.metrics import PRINCIPAL_CACHE_LOOKUPS
+from app.core.redis import get_redis
+from app.models.user import User
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# The password hash is never needed once the token is verified, keep it out of the cache
+CACHED_COLUMNS = [c.key for c in User.__table__.columns if c.key != "hashed_password"]
+DATETIME_COLUMNS = {"created_at", "updated_at"}
+
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: float, redis: Any = None, redis_ttl: int = 300, prefix: str = "principal"):
+        self.local: TTLCache[Dict[str, Any]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis
+        self.redis_ttl = redis_ttl
+        self.prefix = prefix
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "invalidations": 0}
+
+    def _key(self, username: str) -> str:
+        return f"{self.prefix}:{username}"
+
+    @staticmethod
+    def _to_user(data: Dict[str, Any]) -> User:
+        # A fresh detached instance per hit, so requests never share ORM state
+        return User(**data)
+
+    async def get(self, username: str) -> Optional[User]:
+        data = self.local.get(username)
+        if data is not None:
+            self.stats["l1_hits"] += 1
+            PRINCIPAL_CACHE_LOOKUPS.labels("l1_hit").inc()
+            return self._to_user(data)
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._key(username))
+            except Exception:
+                logger.exception("Principal cache L2 read failed")
+                raw = None
+            if raw is not None:
+                data = json.loads(raw)
+                for column in DATETIME_COLUMNS:
+                    if data.get(column):
+                        data[column] = datetime.fromisoformat(data[column])
+                self.local.set(username, data)
+                self.stats["l2_hits"] += 1
+                PRINCIPAL_CACHE_LOOKUPS.labels("l2_hit").inc()
+                return self._to_user(data)
+
+        self.stats["misses"] += 1
+        PRINCIPAL_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    async def set(self, user: User) -> None:
+        data = {column: getattr(user, column) for column in CACHED_COLUMNS}
+        self.local.set(user.username, data)
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    self._key(user.username),
+                    json.dumps(data, default=datetime.isoformat),
+                    ex=self.redis_ttl,
+                )
+            except Exception:
+                logger.exception("Principal cache L2 write failed")
+
+    async def invalidate(self, *usernames: str) -> None:
+        for username in usernames:
+            self.local.delete(username)
+        self.stats["invalidations"] += len(usernames)
+        if self.redis is not None and usernames:
+            try:
+                await self.redis.delete(*(self._key(username) for username in usernames))
+            except Exception:
+                logger.exception("Principal cache L2 invalidation failed")
+
+    def clear(self) -> None:
+        self.local.clear()
+
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    redis=get_redis(),
+    redis_ttl=settings.PRINCIPAL_CACHE_REDIS_TTL_SECONDS,
+)
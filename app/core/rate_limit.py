@@ -0,0 +1,357 @@
+"""Rate limiting algorithms and the backends that hold their per-key state.
+
+Both algorithms keep a fixed three-float state per key, so every check is
+O(1) whatever the request rate, and idle keys can be dropped once their
+state would have decayed back to the initial value.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import time
+from typing import Any, NamedTuple, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.core.redis import FakeRedis, get_redis
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+State = Tuple[float, float, float]
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float
+
+
+class TokenBucket:
+    """Bucket of ``limit`` tokens refilled continuously over ``window`` seconds.
+
+    State is (tokens, last_refill, unused).
+    """
+
+    name = "token_bucket"
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+        # A bucket left alone for a full window is full again
+        self.ttl = window
+
+    def initial(self, now: float) -> State:
+        return (float(self.limit), now, 0.0)
+
+    def apply(self, state: State, now: float) -> Tuple[bool, State, float]:
+        tokens, last, _ = state
+        tokens = min(float(self.limit), tokens + max(0.0, now - last) * self.rate)
+        if tokens >= 1:
+            return True, (tokens - 1, now, 0.0), 0.0
+        return False, (tokens, now, 0.0), (1 - tokens) / self.rate
+
+
+class SlidingWindowCounter:
+    """Fixed windows weighted by overlap with the trailing ``window`` seconds.
+
+    State is (window_start, current_count, previous_count).
+    """
+
+    name = "sliding_window"
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        # After two idle windows both counters are zero again
+        self.ttl = 2 * window
+
+    def initial(self, now: float) -> State:
+        return (math.floor(now / self.window) * self.window, 0.0, 0.0)
+
+    def apply(self, state: State, now: float) -> Tuple[bool, State, float]:
+        start, current, previous = state
+        window_start = math.floor(now / self.window) * self.window
+        if window_start != start:
+            previous = current if window_start - start == self.window else 0.0
+            current = 0.0
+            start = window_start
+
+        weight = 1 - (now - start) / self.window
+        if previous * weight + current + 1 <= self.limit:
+            return True, (start, current + 1, previous), 0.0
+
+        if previous > 0 and current + 1 <= self.limit:
+            # Wait until enough of the previous window has slid out
+            needed = 1 - (self.limit - current - 1) / previous
+            retry_after = start + needed * self.window - now
+        else:
+            retry_after = start + self.window - now
+        return False, (start, current, previous), max(retry_after, 0.0)
+
+
+ALGORITHMS = {
+    TokenBucket.name: TokenBucket,
+    SlidingWindowCounter.name: SlidingWindowCounter,
+}
+
+
+class MemoryBackend:
+    """Per-process state in a bounded LRU/TTL map"""
+
+    def __init__(self, algorithm: Any, max_keys: int = 100_000):
+        self.algorithm = algorithm
+        self._states: TTLCache[State] = TTLCache(maxsize=max_keys, ttl=algorithm.ttl)
+
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        state = self._states.get(key, now=now) or self.algorithm.initial(now)
+        allowed, state, retry_after = self.algorithm.apply(state, now)
+        self._states.set(key, state, now=now)
+        return RateLimitResult(allowed, retry_after)
+
+
+class SharedMemoryBackend:
+    """State shared by every worker on the host through a POSIX shared memory table.
+
+    The table is a fixed array of slots addressed by a 64-bit hash of the
+    key with bounded linear probing; an expired slot or the one closest to
+    expiry inside the probe window is reused, so memory never grows.
+    Access is serialised across processes with ``flock`` on a lock file,
+    taken without blocking so a worker waiting for it keeps serving other
+    requests. The segment outlives the workers; remove_shared_memory() drops
+    it when the gunicorn master exits.
+    """
+
+    _SLOT = struct.Struct("<Qdddd")  # key hash, expires_at, state
+    _PROBES = 8
+    # Backoff while another process holds the lock, which it does for microseconds
+    _LOCK_RETRY_MIN = 0.00005
+    _LOCK_RETRY_MAX = 0.005
+
+    def __init__(self, algorithm: Any, slots: int = 100_000, name: str = "fastapi-rate-limit"):
+        from multiprocessing import resource_tracker, shared_memory
+
+        self.algorithm = algorithm
+        self.slots = slots
+        name = self.segment_name(name, algorithm.name)
+        size = slots * self._SLOT.size
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+            if self._shm.size < size:
+                raise ValueError(f"Shared memory segment '{name}' is smaller than {slots} slots")
+        # The segment outlives any single worker; stop the resource tracker
+        # from unlinking it when this process exits
+        resource_tracker.unregister(self._shm._name, "shared_memory")  # type: ignore[attr-defined]
+
+        self._lock_path = self.lock_path(name)
+        self._lock_fd: Optional[int] = None
+        self._lock_pid = 0
+
+    @staticmethod
+    def segment_name(prefix: str, algorithm_name: str) -> str:
+        return f"{prefix}-{algorithm_name}"
+
+    @staticmethod
+    def lock_path(segment_name: str) -> str:
+        return os.path.join(tempfile.gettempdir(), f"{segment_name}.lock")
+
+    def _lock(self) -> int:
+        """The lock file descriptor of the current process.
+        
+        flock belongs to the open file description, which a forked worker
+        shares with the process that opened it (the preloading gunicorn
+        master), so each process opens the file itself.
+        """
+        pid = os.getpid()
+        if self._lock_pid != pid:
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+            self._lock_fd = os.open(self._lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+            self._lock_pid = pid
+        return self._lock_fd
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        return digest or 1  # zero marks an empty slot
+
+    async def _acquire(self) -> int:
+        import fcntl
+
+        lock_fd = self._lock()
+        delay = self._LOCK_RETRY_MIN
+        while True:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_fd
+            except BlockingIOError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._LOCK_RETRY_MAX)
+
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        import fcntl
+
+        now = time.time() if now is None else now
+        key_hash = self._hash(key)
+        home = key_hash % self.slots
+        buf = self._shm.buf
+        # Nothing between acquiring and releasing awaits, so the lock is
+        # never held across a switch to another request
+        lock_fd = await self._acquire()
+        try:
+            target, state, oldest_expiry = None, None, math.inf
+            for probe in range(self._PROBES):
+                offset = ((home + probe) % self.slots) * self._SLOT.size
+                slot_hash, expires_at, *slot_state = self._SLOT.unpack_from(buf, offset)
+                if slot_hash == key_hash and expires_at > now:
+                    target, state = offset, tuple(slot_state)
+                    break
+                if expires_at < oldest_expiry:
+                    target, oldest_expiry = offset, expires_at
+
+            allowed, state, retry_after = self.algorithm.apply(
+                state or self.algorithm.initial(now), now
+            )
+            self._SLOT.pack_into(buf, target, key_hash, now + self.algorithm.ttl, *state)
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        return RateLimitResult(allowed, retry_after)
+
+
+# KEYS[1] = state key, ARGV = limit, window, now. Returns {allowed, retry_after_ms}.
+TOKEN_BUCKET_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local rate = limit / window
+local state = redis.call('HMGET', KEYS[1], 'a', 'b')
+local tokens = tonumber(state[1]) or limit
+local last = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - last) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'a', tostring(tokens), 'b', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return {allowed, math.ceil(retry_after * 1000)}
+"""
+
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local window_start = math.floor(now / window) * window
+local state = redis.call('HMGET', KEYS[1], 'a', 'b', 'c')
+local start = tonumber(state[1]) or window_start
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if window_start ~= start then
+    if window_start - start == window then previous = current else previous = 0 end
+    current = 0
+    start = window_start
+end
+local weight = 1 - (now - start) / window
+local allowed = 0
+local retry_after = 0
+if previous * weight + current + 1 <= limit then
+    current = current + 1
+    allowed = 1
+elseif previous > 0 and current + 1 <= limit then
+    retry_after = start + (1 - (limit - current - 1) / previous) * window - now
+else
+    retry_after = start + window - now
+end
+redis.call('HSET', KEYS[1], 'a', tostring(start), 'b', tostring(current), 'c', tostring(previous))
+redis.call('PEXPIRE', KEYS[1], math.ceil(2 * window * 1000))
+return {allowed, math.ceil(math.max(retry_after, 0) * 1000)}
+"""
+
+REDIS_SCRIPTS = {
+    TokenBucket.name: TOKEN_BUCKET_LUA,
+    SlidingWindowCounter.name: SLIDING_WINDOW_LUA,
+}
+
+
+def _emulate_script(algorithm_cls: Any) -> Any:
+    def run(redis: FakeRedis, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        algorithm = algorithm_cls(int(args[0]), float(args[1]))
+        now = float(args[2])
+        state = redis.load(keys[0]) or algorithm.initial(now)
+        allowed, state, retry_after = algorithm.apply(state, now)
+        redis.store(keys[0], state, algorithm.ttl)
+        return [int(allowed), math.ceil(retry_after * 1000)]
+    return run
+
+for _algorithm_cls in ALGORITHMS.values():
+    FakeRedis.emulate(REDIS_SCRIPTS[_algorithm_cls.name])(_emulate_script(_algorithm_cls))
+
+
+class RedisBackend:
+    """State shared by every worker and host through an atomic Lua script"""
+
+    def __init__(self, algorithm: Any, client: Any, prefix: str = "ratelimit"):
+        self.algorithm = algorithm
+        self.prefix = f"{prefix}:{algorithm.name}"
+        self._script = client.register_script(REDIS_SCRIPTS[algorithm.name])
+
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        allowed, retry_after_ms = await self._script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[self.algorithm.limit, self.algorithm.window, now],
+        )
+        return RateLimitResult(bool(int(allowed)), int(retry_after_ms) / 1000)
+
+
+def remove_shared_memory(prefix: Optional[str] = None) -> None:
+    """Unlink the shared memory segments and lock files under ``prefix``.
+
+    For the gunicorn master on exit, once no worker uses them any more.
+    """
+    from multiprocessing import shared_memory
+
+    prefix = prefix or settings.RATE_LIMIT_SHM_NAME
+    for algorithm_name in ALGORITHMS:
+        name = SharedMemoryBackend.segment_name(prefix, algorithm_name)
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        segment.close()
+        # unlink() also unregisters the segment from this process's resource tracker
+        segment.unlink()
+        try:
+            os.unlink(SharedMemoryBackend.lock_path(name))
+        except FileNotFoundError:
+            pass
+
+
+def create_rate_limit_backend(
+    limit: int,
+    window: float = 60.0,
+    algorithm: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> Any:
+    """Build the backend configured by the RATE_LIMIT_* settings"""
+    algorithm_cls = ALGORITHMS[algorithm or settings.RATE_LIMIT_ALGORITHM]
+    backend = backend or settings.RATE_LIMIT_BACKEND
+    rate_algorithm = algorithm_cls(limit, window)
+
+    if backend == "redis":
+        client = get_redis()
+        if client is None:
+            raise ValueError("RATE_LIMIT_BACKEND is 'redis' but REDIS_URL is not set")
+        return RedisBackend(rate_algorithm, client)
+    if backend == "shared_memory":
+        return SharedMemoryBackend(
+            rate_algorithm, slots=settings.RATE_LIMIT_MAX_KEYS, name=settings.RATE_LIMIT_SHM_NAME
+        )
+    return MemoryBackend(rate_algorithm, max_keys=settings.RATE_LIMIT_MAX_KEYS)
@@ -0,0 +1,87 @@
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from app.core.config import settings
+
+_client: Any = None
+
+def get_redis() -> Any:
+    """Shared asyncio Redis client for REDIS_URL, or None when Redis is not configured"""
+    global _client
+    if _client is None and settings.REDIS_URL:
+        # Redis is an optional dependency, only import it when it is configured
+        import redis.asyncio as redis
+        _client = redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+ScriptEmulation = Callable[["FakeRedis", Sequence[str], Sequence[Any]], Any]
+
+class FakeRedis:
+    """In-process stand-in for the subset of the redis.asyncio client the app uses.
+
+    Lua scripts cannot run in-process, so every script passed to
+    ``register_script`` must have a Python emulation registered with
+    ``FakeRedis.emulate`` next to its Lua source.
+    """
+
+    _emulations: Dict[str, ScriptEmulation] = {}
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+
+    @classmethod
+    def emulate(cls, lua: str) -> Callable[[ScriptEmulation], ScriptEmulation]:
+        def decorator(func: ScriptEmulation) -> ScriptEmulation:
+            cls._emulations[lua] = func
+            return func
+        return decorator
+
+    def load(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def store(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, None if ttl is None else time.time() + ttl)
+
+    async def get(self, name: str) -> Any:
+        return self.load(name)
+
+    async def set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[float] = None,
+        px: Optional[float] = None,
+        nx: bool = False,
+    ) -> Optional[bool]:
+        if nx and self.load(name) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self.store(name, value if isinstance(value, bytes) else str(value).encode(), ttl)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    async def incr(self, name: str) -> int:
+        value = int(self.load(name) or 0) + 1
+        entry = self._data.get(name)
+        self._data[name] = (str(value).encode(), entry[1] if entry else None)
+        return value
+
+    def flushall(self) -> None:
+        self._data.clear()
+
+    def register_script(self, script: str) -> Callable[..., Any]:
+        emulation = self._emulations[script]
+
+        async def run(keys: Sequence[str] = (), args: Sequence[Any] = ()) -> Any:
+            return emulation(self, keys, args)
+
+        return run
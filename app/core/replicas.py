@@ -0,0 +1,159 @@
+"""Read replica selection and the session class that routes queries to them.
+
+Reads (plain SELECTs) go to a healthy replica whose replication lag is within
+bounds; everything else goes to the primary. Once a session has written, all
+of its later reads stay on the primary so a request always sees its own
+writes. When no replica qualifies, reads fall back to the primary. Reads
+whose rows are cached run under ``primary_reads``: a lagging replica would
+put back the row a write has just invalidated.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Sequence, Union
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+from app.core.metrics import DB_REPLICA_HEALTHY, DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+# 0 when the replica has replayed everything it received, so an idle primary
+# does not look like lag
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+LagProbe = Callable[[Connection], float]
+
+def default_lag_probe(connection: Connection) -> float:
+    """Replication lag in seconds; backends without replication report 0"""
+    if connection.dialect.name == "postgresql":
+        return float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0.0)
+    connection.execute(text("SELECT 1"))
+    return 0.0
+
+
+class Replica:
+    def __init__(self, name: str, engine: Union[Engine, AsyncEngine]):
+        self.name = name
+        self.engine = engine
+        # Sessions always bind to the sync engine, also under AsyncSession
+        self.bind: Engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at: Optional[float] = None
+
+
+class ReplicaSet:
+    """Round-robin over replicas that passed their last health check"""
+
+    def __init__(
+        self,
+        engines: Sequence[Union[Engine, AsyncEngine]],
+        max_lag: float = 5.0,
+        lag_probe: LagProbe = default_lag_probe,
+    ):
+        self.replicas = [Replica(f"replica-{i}", engine) for i, engine in enumerate(engines)]
+        self.max_lag = max_lag
+        self.lag_probe = lag_probe
+        self._cycle = itertools.cycle(self.replicas)
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def choose(self) -> Optional[Engine]:
+        """Bind for the next usable replica, or None to read from the primary"""
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy and replica.lag <= self.max_lag:
+                return replica.bind
+        return None
+
+    async def _probe(self, replica: Replica) -> float:
+        if isinstance(replica.engine, AsyncEngine):
+            async with replica.engine.connect() as conn:
+                return await conn.run_sync(self.lag_probe)
+
+        def probe() -> float:
+            with replica.engine.connect() as conn:
+                return self.lag_probe(conn)
+
+        return await run_in_threadpool(probe)
+
+    async def check(self) -> None:
+        """Probe every replica once, updating health and lag"""
+        for replica in self.replicas:
+            try:
+                replica.lag = await self._probe(replica)
+                replica.healthy = True
+            except Exception:
+                if replica.healthy:
+                    logger.warning("Replica %s failed its health check", replica.name, exc_info=True)
+                replica.healthy = False
+            replica.checked_at = time.monotonic()
+            DB_REPLICA_HEALTHY.labels(replica.name).set(1 if replica.healthy else 0)
+            DB_REPLICA_LAG.labels(replica.name).set(replica.lag)
+
+    async def run_health_checks(self, interval: float) -> None:
+        """Re-check every ``interval`` seconds after the initial check"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check()
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            if isinstance(replica.engine, AsyncEngine):
+                await replica.engine.dispose()
+            else:
+                replica.engine.dispose()
+
+
+class RoutingSession(Session):
+    """Session sending SELECTs to a replica and everything else to the primary.
+
+    One replica is picked per session so all reads of a request see the same
+    snapshot. After the first write (or flush) the session sticks to the
+    primary for read-your-writes.
+    """
+
+    def __init__(self, *args: Any, replicas: Optional[ReplicaSet] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.wrote = False
+        self.primary_only = False
+        self._replica_bind: Optional[Engine] = None
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kwargs: Any) -> Any:
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            self.wrote = True
+        elif self.replicas and not self.wrote and not self.primary_only and isinstance(clause, Select):
+            if self._replica_bind is None:
+                self._replica_bind = self.replicas.choose()
+            if self._replica_bind is not None:
+                return self._replica_bind
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+@contextmanager
+def primary_reads(session: Any) -> Iterator[None]:
+    """Send the reads ``session`` makes inside the block to the primary.
+
+    Accepts a Session, an AsyncSession or a SyncSessionAdapter; sessions
+    without replica routing are left as they are.
+    """
+    session = getattr(session, "sync_session", session)
+    if not isinstance(session, RoutingSession):
+        yield
+        return
+    previous, session.primary_only = session.primary_only, True
+    try:
+        yield
+    finally:
+        session.primary_only = previous
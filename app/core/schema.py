@@ -0,0 +1,64 @@
+"""Startup check that the database schema is at the Alembic head revision.
+
+Alembic owns the schema in production, so instead of reflecting every table
+with ``create_all`` on each worker boot, startup reads ``alembic_version``
+(one query) and refuses to start when it differs from the head revision of
+the migration scripts shipped with the code.
+
+Under gunicorn the check runs once in the master (see gunicorn.conf.py),
+which records the verified revision in SCHEMA_REVISION_ENV so the workers
+can skip it. The head revision is read from the scripts once per process
+and kept, so forked workers inherit the master's value and only compare.
+"""
+import os
+from pathlib import Path
+from typing import FrozenSet, Optional
+from sqlalchemy.engine import Connection
+
+SCRIPT_LOCATION = Path(__file__).resolve().parents[2] / "alembic"
+
+# Set by the gunicorn master to the revision it verified
+SCHEMA_REVISION_ENV = "APP_SCHEMA_REVISION_VERIFIED"
+
+class SchemaRevisionMismatch(RuntimeError):
+    """The database is not at the revision the code expects"""
+
+
+_head_revisions: Optional[FrozenSet[str]] = None
+
+
+def head_revisions() -> FrozenSet[str]:
+    """Head revisions of the migration scripts, loaded on first use"""
+    global _head_revisions
+    if _head_revisions is None:
+        # Imported here: only startup needs alembic's script machinery
+        from alembic.script import ScriptDirectory
+
+        _head_revisions = frozenset(ScriptDirectory(str(SCRIPT_LOCATION)).get_heads())
+    return _head_revisions
+
+
+def current_revisions(connection: Connection) -> FrozenSet[str]:
+    from alembic.runtime.migration import MigrationContext
+
+    return frozenset(MigrationContext.configure(connection).get_current_heads())
+
+
+def check_revision(connection: Connection) -> str:
+    """Raise SchemaRevisionMismatch unless the database is at head; returns the head"""
+    expected = head_revisions()
+    found = current_revisions(connection)
+    if found != expected:
+        raise SchemaRevisionMismatch(
+            f"Database schema is at {', '.join(sorted(found)) or 'no revision'}, "
+            f"expected {', '.join(sorted(expected))}; run 'alembic upgrade head'"
+        )
+    return ",".join(sorted(expected))
+
+
+def verified_revision() -> Optional[str]:
+    """The revision already verified by the gunicorn master, if it is still the head"""
+    verified = os.environ.get(SCHEMA_REVISION_ENV)
+    if verified and verified == ",".join(sorted(head_revisions())):
+        return verified
+    return None
@@ -1,11 +1,47 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core import metrics
+from app.utils.exceptions import ServiceUnavailableException
+from app.utils.executor import BoundedExecutor, ExecutorSaturated
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Typical run time of one verify (moving average), for callers that skip or imitate one
+verify_seconds = 0.0
+
+def _observe_hashing(fn, wait: float, runtime: float) -> None:
+    global verify_seconds
+    operation = {"verify_password": "verify", "get_password_hash": "hash"}.get(fn.__name__, "bulk_hash")
+    if operation == "verify":
+        verify_seconds = runtime if not verify_seconds else 0.9 * verify_seconds + 0.1 * runtime
+    metrics.PASSWORD_HASH_QUEUE_WAIT.labels(operation).observe(wait)
+    metrics.PASSWORD_HASH_DURATION.labels(operation).observe(runtime)
+    metrics.PASSWORD_HASH_QUEUE_DEPTH.set(password_hasher.queue_depth)
+
+# bcrypt gets its own pool so a burst of logins cannot starve the shared threadpool
+password_hasher = BoundedExecutor(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    name="bcrypt",
+    observer=_observe_hashing,
+)
+
+# Bulk imports hash whole batches at once; keep them off the login pool.
+# Concurrent imports take turns batch by batch rather than failing part-way
+# through, after earlier batches were already committed
+bulk_password_hasher = BoundedExecutor(
+    kind=settings.BULK_IMPORT_HASH_EXECUTOR,
+    max_workers=settings.BULK_IMPORT_HASH_WORKERS,
+    max_queue=0,
+    name="bcrypt-bulk",
+    observer=_observe_hashing,
+    wait_for_capacity=True,
+)
+
 ALGORITHM = "HS256"
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -14,6 +50,57 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def _run_hasher(fn, *args):
+    try:
+        return await password_hasher.run(fn, *args)
+    except ExecutorSaturated:
+        metrics.PASSWORD_HASH_REJECTIONS.inc()
+        raise ServiceUnavailableException("Server is busy, please retry")
+    finally:
+        metrics.PASSWORD_HASH_QUEUE_DEPTH.set(password_hasher.queue_depth)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hasher(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hasher(get_password_hash, password)
+
+async def get_password_hashes_bulk(passwords: List[str]) -> List[str]:
+    return await bulk_password_hasher.map(get_password_hash, passwords)
+
+class Principal(NamedTuple):
+    """The authenticated caller, as far as authorization needs to know"""
+    id: int
+    username: str
+    is_active: bool
+    is_superuser: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(user.id, user.username, user.is_active, user.is_superuser, user.token_version or 0)
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> Optional["Principal"]:
+        """None for tokens issued without the authorization claims"""
+        try:
+            return cls(
+                int(claims["uid"]), claims["sub"], bool(claims["is_active"]),
+                bool(claims["is_superuser"]), int(claims["token_version"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+def access_token_claims(user: Any) -> Dict[str, Any]:
+    """Claims for a user's access token; in JWT_CLAIMS_MODE they carry what authorization needs"""
+    claims: Dict[str, Any] = {"sub": user.username}
+    if settings.JWT_CLAIMS_MODE:
+        claims.update(
+            uid=user.id, is_active=user.is_active, is_superuser=user.is_superuser,
+            token_version=user.token_version or 0,
+        )
+    return claims
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -25,10 +112,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str) -> Optional[str]:
+def decode_access_claims(token: str) -> Optional[Dict[str, Any]]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        username: Optional[str] = payload.get("sub")
-        return username
+        with metrics.JWT_DECODE_DURATION.time():
+            return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+def decode_access_token(token: str) -> Optional[str]:
+    claims = decode_access_claims(token)
+    if claims is None:
+        return None
+    username: Optional[str] = claims.get("sub")
+    return username
@@ -0,0 +1,83 @@
+"""Revocation of self-contained access tokens (JWT_CLAIMS_MODE).
+
+A token is revoked once the user's ``token_version`` has moved past the
+version signed into it. Every worker keeps a small map of the current
+version of users changed within the token lifetime (older changes can only
+affect tokens that have already expired), refreshed every
+TOKEN_REVOCATION_REFRESH_SECONDS. Writes made by this worker are applied at
+once; writes made by other workers are picked up by the next refresh.
+
+Deleted users have no row left to read, so the refresh also re-reads the
+users that authenticated here since the previous refresh and revokes the
+ones that are gone.
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Set
+from sqlalchemy import select
+from app.core.config import settings
+from app.models.user import User
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Minimum version of a deleted user: no token can reach it
+REVOKE_ALL = sys.maxsize
+
+# Keeps the IN list of seen users to a reasonable size per query
+SEEN_BATCH_SIZE = 1000
+
+class TokenRevocations:
+    def __init__(self, lifetime_seconds: float, max_local: int = 10_000):
+        self.lifetime_seconds = lifetime_seconds
+        # user id -> lowest accepted token_version, as of the last refresh
+        self.min_versions: Dict[int, int] = {}
+        # Revocations made by this worker since; kept for a token lifetime
+        self.local: TTLCache[int] = TTLCache(maxsize=max_local, ttl=lifetime_seconds)
+        self.seen: Set[int] = set()
+
+    def is_revoked(self, user_id: int, token_version: int) -> bool:
+        self.seen.add(user_id)
+        return token_version < max(self.min_versions.get(user_id, 0), self.local.get(user_id, 0))
+
+    def revoke(self, user_id: int, min_version: int = REVOKE_ALL) -> None:
+        self.local.set(user_id, max(min_version, self.local.get(user_id, 0)))
+
+    async def refresh(self, db: Any) -> None:
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.lifetime_seconds)
+        result = await db.execute(
+            select(User.id, User.token_version).where(User.token_version > 0, User.updated_at >= cutoff)
+        )
+        min_versions = {row.id: row.token_version for row in result}
+
+        seen = list(self.seen)
+        existing: Set[int] = set()
+        for i in range(0, len(seen), SEEN_BATCH_SIZE):
+            result = await db.execute(select(User.id).where(User.id.in_(seen[i:i + SEEN_BATCH_SIZE])))
+            existing.update(result.scalars())
+        for user_id in seen:
+            if user_id not in existing:
+                self.revoke(user_id)
+
+        self.min_versions = min_versions
+        self.seen.difference_update(seen)
+
+    async def run_refresher(self, session_scope: Callable[[], Any], interval: float) -> None:
+        """Refresh every ``interval`` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_scope() as db:
+                    await self.refresh(db)
+            except Exception:
+                logger.exception("Token revocation refresh failed")
+
+    def clear(self) -> None:
+        self.min_versions.clear()
+        self.local.clear()
+        self.seen.clear()
+
+
+token_revocations = TokenRevocations(lifetime_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
@@ -0,0 +1,208 @@
+"""Read-through cache of serialized user responses.
+
+Entries hold the exact JSON body (and ETag) sent to clients, so a hit skips
+the query, validation and serialization. Single users and list pages are
+keyed under generation counters (one per user, one for all pages) that every
+write bumps, which retires the old entries at once. A load that read the row
+before a write committed therefore stores under a generation nobody reads any
+more, instead of putting the stale body back. Total counts are kept per
+counting mode and only dropped when a user is created or deleted.
+
+Stampedes are avoided with a per-key lock (SET NX): on a miss only the lock
+holder queries the database while the others wait briefly for its result,
+and entries close to expiry are refreshed early by one request while the
+rest keep serving the current copy. Without REDIS_URL the cache is off unless
+USER_CACHE_LOCAL is set, which runs the same logic against an in-process
+FakeRedis and is only coherent with a single worker process.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import USER_CACHE_LOOKUPS
+from app.core.redis import FakeRedis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# (JSON body, ETag or "")
+Payload = Tuple[bytes, str]
+Loader = Callable[[], Awaitable[Payload]]
+
+COUNT_MODES = ("exact", "estimated")
+
+class UserCache:
+    def __init__(
+        self,
+        redis: Any,
+        ttl: int = 60,
+        refresh_ahead: float = 5.0,
+        lock_timeout: float = 2.0,
+        enabled: bool = True,
+        prefix: str = "users",
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl / 2)
+        self.lock_timeout = lock_timeout
+        self.enabled = enabled
+        self.prefix = prefix
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "lock_waits": 0}
+
+    def _user_generation_key(self, user_id: int) -> str:
+        return f"{self.prefix}:user:{user_id}:generation"
+
+    @property
+    def _generation_key(self) -> str:
+        return f"{self.prefix}:generation"
+
+    async def _generation(self, key: str) -> Optional[int]:
+        """Current value of a generation counter; None when the cache cannot be reached"""
+        try:
+            return int(await self.redis.get(key) or 0)
+        except Exception:
+            logger.exception("User cache read failed")
+            return None
+
+    def _encode(self, payload: Payload) -> bytes:
+        body, etag = payload
+        refresh_at = time.time() + self.ttl - self.refresh_ahead
+        return f"{refresh_at}\n{etag}\n".encode() + body
+
+    @staticmethod
+    def _decode(raw: bytes) -> Tuple[float, Payload]:
+        refresh_at, etag, body = raw.split(b"\n", 2)
+        return float(refresh_at), (body, etag.decode())
+
+    async def _store(self, key: str, payload: Payload) -> None:
+        await self.redis.set(key, self._encode(payload), ex=self.ttl)
+
+    async def _acquire(self, key: str) -> Optional[bool]:
+        """Take the load lock for ``key``; None when the cache cannot be reached"""
+        try:
+            # Expires on its own, so a crashed loader only delays the others by lock_timeout
+            return bool(await self.redis.set(f"{key}:lock", b"1", px=int(self.lock_timeout * 1000), nx=True))
+        except Exception:
+            logger.exception("User cache read failed")
+            return None
+
+    async def _release(self, key: str) -> None:
+        try:
+            await self.redis.delete(f"{key}:lock")
+        except Exception:
+            logger.exception("User cache write failed")
+
+    async def _load_and_store(self, key: str, loader: Loader) -> Payload:
+        # Loader errors (e.g. NotFoundException) propagate; only cache errors are swallowed
+        try:
+            payload = await loader()
+            try:
+                await self._store(key, payload)
+            except Exception:
+                logger.exception("User cache write failed")
+            return payload
+        finally:
+            await self._release(key)
+
+    async def _wait_for(self, key: str) -> Optional[Payload]:
+        """Poll for the value another request is loading, up to the lock timeout"""
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+            try:
+                raw = await self.redis.get(key)
+            except Exception:
+                logger.exception("User cache read failed")
+                return None
+            if raw is not None:
+                return self._decode(raw)[1]
+        return None
+
+    async def get_or_load(self, key: str, loader: Loader) -> Payload:
+        if not self.enabled:
+            return await loader()
+        try:
+            raw = await self.redis.get(key)
+        except Exception:
+            # Fail open: an unreachable cache must not fail the read
+            logger.exception("User cache read failed")
+            return await loader()
+
+        if raw is not None:
+            refresh_at, payload = self._decode(raw)
+            self.stats["hits"] += 1
+            USER_CACHE_LOOKUPS.labels("hit").inc()
+            if time.time() >= refresh_at and await self._acquire(key):
+                self.stats["refreshes"] += 1
+                return await self._load_and_store(key, loader)
+            return payload
+
+        self.stats["misses"] += 1
+        USER_CACHE_LOOKUPS.labels("miss").inc()
+        acquired = await self._acquire(key)
+        if acquired:
+            return await self._load_and_store(key, loader)
+        if acquired is False:
+            self.stats["lock_waits"] += 1
+            payload = await self._wait_for(key)
+            if payload is not None:
+                return payload
+        return await loader()
+
+    async def get_user(self, user_id: int, loader: Loader) -> Payload:
+        if not self.enabled:
+            return await loader()
+        # Read before the loader runs: a write that commits meanwhile bumps it
+        generation = await self._generation(self._user_generation_key(user_id))
+        if generation is None:
+            return await loader()
+        return await self.get_or_load(f"{self.prefix}:user:{user_id}:{generation}", loader)
+
+    async def get_list(self, skip: int, limit: int, loader: Loader) -> Payload:
+        if not self.enabled:
+            return await loader()
+        generation = await self._generation(self._generation_key)
+        if generation is None:
+            return await loader()
+        return await self.get_or_load(f"{self.prefix}:list:{generation}:{skip}:{limit}", loader)
+
+    async def get_count(self, mode: str, loader: Loader) -> Payload:
+        return await self.get_or_load(f"{self.prefix}:count:{mode}", loader)
+
+    async def invalidate(self, *user_ids: int) -> None:
+        """Drop the given users and every cached list page"""
+        if not self.enabled:
+            return
+        try:
+            for user_id in user_ids:
+                await self.redis.incr(self._user_generation_key(user_id))
+            await self.redis.incr(self._generation_key)
+        except Exception:
+            logger.exception("User cache invalidation failed")
+
+    async def invalidate_counts(self) -> None:
+        """Drop the cached total counts; updates leave them alone"""
+        if not self.enabled:
+            return
+        try:
+            await self.redis.delete(*(f"{self.prefix}:count:{mode}" for mode in COUNT_MODES))
+        except Exception:
+            logger.exception("User cache invalidation failed")
+
+    def clear(self) -> None:
+        """Reset the in-process fallback (a shared Redis is left alone)"""
+        if isinstance(self.redis, FakeRedis):
+            self.redis.flushall()
+
+
+_redis = get_redis()
+
+user_cache = UserCache(
+    redis=_redis or FakeRedis(),
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    refresh_ahead=settings.USER_CACHE_REFRESH_AHEAD_SECONDS,
+    lock_timeout=settings.USER_CACHE_LOCK_TIMEOUT_SECONDS,
+    # Per-worker copies would keep serving bodies, ETags and counts that another
+    # worker has just changed, so the in-process fallback is opt-in
+    enabled=settings.USER_CACHE_ENABLED and (_redis is not None or settings.USER_CACHE_LOCAL),
+)
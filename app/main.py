@@ -1,11 +1,18 @@
-from fastapi import FastAPI, Request, Response
+from fastapi import APIRouter, FastAPI, Response
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse
 from sqlalchemy.exc import SQLAlchemyError
 from contextlib import asynccontextmanager
+import asyncio
 
 from app.core.config import settings
-from app.core.database import engine
+from app.core.metrics import render_metrics
+from app.core import database
+from app.core.database import primary_session_scope
+from app.core.login_guard import login_guard
+from app.core.token_revocation import token_revocations
+from app.core.schema import check_revision, verified_revision
+from app.core.security import password_hasher, bulk_password_hasher
 from app.models.user import Base
 from app.api.v1.router import api_router
 from app.middleware.cors import setup_cors
@@ -15,51 +22,89 @@ from app.middleware.error_handler import (
     general_exception_handler
 )
 from app.middleware.rate_limiter import RateLimiter
+from app.middleware.metrics import PrometheusMiddleware
+from app.middleware.access_log import AccessLogger
+from app.core.rate_limit import create_rate_limit_backend
 from app.utils.logger import setup_logger
+from app.utils.timing import PhaseTimer
 
 # Setup logger
 logger = setup_logger(__name__, "logs/app.log")
+access_logger = setup_logger("app.access", "logs/app.log")
+
+async def prepare_schema() -> None:
+    """Create missing tables (development) or verify the Alembic revision (production)"""
+    if settings.DB_SCHEMA_STARTUP == "create_all":
+        if database.async_engine is not None:
+            async with database.async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        else:
+            Base.metadata.create_all(bind=database.engine)
+    elif settings.DB_SCHEMA_STARTUP == "check":
+        if verified_revision() is not None:
+            # Already checked once by the gunicorn master
+            return
+        if database.async_engine is not None:
+            async with database.async_engine.connect() as conn:
+                await conn.run_sync(check_revision)
+        else:
+            with database.engine.connect() as conn:
+                check_revision(conn)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     logger.info("Starting application...")
-    # Create tables (for development only, use Alembic in production)
-    Base.metadata.create_all(bind=engine)
-    logger.info("Application started successfully")
+    timer = PhaseTimer()
+    # Engines are created per worker, never in a preloading gunicorn master
+    with timer.phase("engines"):
+        database.init_engines()
+    with timer.phase("schema"):
+        await prepare_schema()
+    health_checks = None
+    replica_set = database.replica_set
+    if replica_set is not None:
+        # First check before serving so an unreachable replica is never used
+        with timer.phase("replicas"):
+            await replica_set.check()
+        health_checks = asyncio.create_task(
+            replica_set.run_health_checks(settings.DATABASE_REPLICA_CHECK_INTERVAL_SECONDS)
+        )
+    revocation_refresh = None
+    if settings.JWT_CLAIMS_MODE:
+        with timer.phase("token_revocations"):
+            async with primary_session_scope() as db:
+                await token_revocations.refresh(db)
+        revocation_refresh = asyncio.create_task(
+            token_revocations.run_refresher(primary_session_scope, settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+        )
+    if login_guard.enabled:
+        # Times one bcrypt verify for the unknown-user padding
+        with timer.phase("login_guard"):
+            await login_guard.warm_up()
+    logger.info(
+        "Application started successfully in %.1f ms", timer.total_ms,
+        extra={"startup_ms": timer.total_ms, "startup_phases": timer.phases},
+    )
     
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
+    if revocation_refresh is not None:
+        revocation_refresh.cancel()
+    if health_checks is not None:
+        health_checks.cancel()
+    password_hasher.shutdown()
+    bulk_password_hasher.shutdown()
+    await database.dispose_engines()
     logger.info("Application shut down successfully")
 
-# Initialize FastAPI app
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.VERSION,
-    docs_url="/swagger",
-    redoc_url=None,  # Disable default ReDoc to use custom
-    lifespan=lifespan
-)
-
-# Setup CORS
-setup_cors(app)
-
-# Add rate limiting middleware
-app.middleware("http")(RateLimiter(requests_per_minute=100))
-
-# Exception handlers
-app.add_exception_handler(RequestValidationError, validation_exception_handler)  # type: ignore
-app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)  # type: ignore
-app.add_exception_handler(Exception, general_exception_handler)
-
-# Include API router
-app.include_router(api_router, prefix=settings.API_V1_STR)
+router = APIRouter()
 
 # Health check endpoint
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
@@ -68,7 +113,13 @@ async def health_check():
         "service": settings.PROJECT_NAME
     }
 
-@app.get("/")
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+@router.get("/")
 async def root():
     """Root endpoint"""
     return {
@@ -78,7 +129,7 @@ async def root():
     }
 
 # Custom ReDoc endpoint with stable CDN
-@app.get("/redoc", response_class=HTMLResponse, include_in_schema=False)
+@router.get("/redoc", response_class=HTMLResponse, include_in_schema=False)
 async def redoc_html():
     """ReDoc documentation"""
     return f"""
@@ -104,10 +155,43 @@ async def redoc_html():
     </html>
     """
 
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"Response: {response.status_code}")
-    return response
\ No newline at end of file
+def create_app() -> FastAPI:
+    """Build the application.
+    
+    Importing this module opens no connections or threads that would break
+    across a fork: engines are created in the lifespan of each worker, so
+    gunicorn can preload the app in the master and share its memory.
+    """
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        version=settings.VERSION,
+        docs_url="/swagger",
+        redoc_url=None,  # Disable default ReDoc to use custom
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+    
+    # Setup CORS
+    setup_cors(app)
+    
+    # Add rate limiting middleware
+    app.add_middleware(RateLimiter, backend=create_rate_limit_backend(settings.RATE_LIMIT_PER_MINUTE))
+    
+    # Request metrics; registered after the rate limiter so rejected requests are timed too
+    if settings.METRICS_ENABLED:
+        app.add_middleware(PrometheusMiddleware)
+    
+    # Exception handlers
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)  # type: ignore
+    app.add_exception_handler(SQLAlchemyError, sqlalchemy_exception_handler)  # type: ignore
+    app.add_exception_handler(Exception, general_exception_handler)
+    
+    # Include API router
+    app.include_router(api_router, prefix=settings.API_V1_STR)
+    app.include_router(router)
+    
+    # Logging middleware
+    app.add_middleware(AccessLogger, logger=access_logger, sample_rate=settings.ACCESS_LOG_SAMPLE_RATE)
+    return app
+
+app = create_app()
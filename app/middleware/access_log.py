@@ -0,0 +1,52 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
+import random
+import time
+
+class AccessLogger:
+    """Write one access log record per request, sampling successful responses"""
+
+    def __init__(self, app: ASGIApp, logger: logging.Logger, sample_rate: float = 1.0):
+        self.app = app
+        self.logger = logger
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._log(scope, status_code, time.perf_counter() - start)
+
+    def _log(self, scope: Scope, status_code: int, duration: float) -> None:
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if 200 <= status_code < 300 and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        client = scope.get("client")
+        # Arguments are interpolated on the listener thread, not here
+        self.logger.info(
+            "%s %s %s",
+            scope["method"],
+            scope["path"],
+            status_code,
+            extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "client": client[0] if client else None,
+            },
+        )
@@ -10,4 +10,6 @@ def setup_cors(app: FastAPI):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Readable by browser clients (conditional requests, admin paging)
+        expose_headers=["ETag", "X-Total-Count"],
     )
\ No newline at end of file
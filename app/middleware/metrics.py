@@ -0,0 +1,39 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+from app.core.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_PROGRESS
+
+def _route_template(scope: Scope) -> str:
+    # Label by the route template, never the raw path, to keep cardinality bounded.
+    # The router stores the matched route in the scope, so there is no second match.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class PrometheusMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        # The route is only known once the router has run
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            HTTP_REQUEST_DURATION.labels(method, _route_template(scope), str(status_code)).observe(
+                time.perf_counter() - start
+            )
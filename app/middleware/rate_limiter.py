@@ -1,33 +1,42 @@
-from fastapi import Request, HTTPException, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-import time
-from typing import Dict
-from collections import defaultdict
+from starlette.types import ASGIApp, Receive, Scope, Send
+import logging
+import math
+from app.core.metrics import RATE_LIMIT_REJECTIONS
+from app.core.rate_limit import RateLimitResult
+
+logger = logging.getLogger(__name__)
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
-        self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = defaultdict(list)
+    def __init__(self, app: ASGIApp, backend):
+        self.app = app
+        self.backend = backend
     
-    async def __call__(self, request: Request, call_next):
-        client_ip = request.client.host if request.client else "unknown"
-        current_time = time.time()
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if current_time - req_time < 60
-        ]
+        try:
+            result = await self.backend.hit(client_ip)
+        except Exception:
+            # Fail open: a broken limiter backend must not take the API down
+            logger.exception("Rate limiter backend failed")
+            result = RateLimitResult(allowed=True, retry_after=0.0)
         
         # Check rate limit
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            return JSONResponse(
+        if not result.allowed:
+            RATE_LIMIT_REJECTIONS.inc()
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={"detail": "Too many requests"}
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))}
             )
+            await response(scope, receive, send)
+            return
         
-        # Add current request
-        self.requests[client_ip].append(current_time)
-        
-        response = await call_next(request)
-        return response
\ No newline at end of file
+        await self.app(scope, receive, send)
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, DDL, Index, Integer, String, Boolean, DateTime, event, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime, timezone
 
 Base = declarative_base()
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -14,5 +17,29 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_superuser: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(timezone.utc))
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    # Bumped on changes that must invalidate issued access tokens
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # Callables, so each row gets the time of its own insert/update
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+def _search_indexes(column: str) -> None:
+    """Postgres indexes for the user search on lower(<column>): a trigram GIN
+    index serves substring LIKE, a text_pattern_ops btree serves prefix LIKE"""
+    lowered = func.lower(User.__table__.c[column]).label(f"{column}_lower")
+    Index(
+        f"ix_users_{column}_trgm", lowered,
+        postgresql_using="gin", postgresql_ops={f"{column}_lower": "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
+    Index(
+        f"ix_users_{column}_prefix", lowered,
+        postgresql_ops={f"{column}_lower": "text_pattern_ops"},
+    ).ddl_if(dialect="postgresql")
+
+_search_indexes("username")
+_search_indexes("email")
+
+event.listen(
+    User.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
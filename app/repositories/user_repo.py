@@ -1,50 +1,286 @@
-from typing import Optional, List
-from sqlalchemy.orm import Session
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, List, Sequence, Set, Tuple
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select, text, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from app.core.database import DBSession
+from app.core.principal_cache import principal_cache
+from app.core.token_revocation import token_revocations
+from app.core.user_cache import user_cache
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async, get_password_hashes_bulk
+from app.utils.dataloader import DataLoader
+
+users_table = User.__table__
+
+# Changing any of these revokes the user's access tokens
+TOKEN_REVOKING_FIELDS = {"username", "hashed_password", "is_active", "is_superuser"}
+
+# Matches SQLite ("UNIQUE constraint failed: users.email"), Postgres index
+# names ("ix_users_email") and Postgres details ("Key (email)=..."), but not
+# NOT NULL violations ("NOT NULL constraint failed: users.email")
+UNIQUE_VIOLATION = re.compile(r"(?:UNIQUE constraint failed: users\.|\"ix_users_|Key \()(email|username)\b")
+
+def unique_violation_field(exc: IntegrityError) -> Optional[str]:
+    """The unique column ("email" or "username") an IntegrityError was raised for"""
+    match = UNIQUE_VIOLATION.search(str(exc.orig))
+    return match.group(1) if match else None
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _to_user(row: Row) -> User:
+    # Built from the returned columns: no identity map entry to expire on commit
+    return User(**row._mapping)
 
 class UserRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: DBSession):
         self.db = db
     
-    def get_by_id(self, user_id: int) -> Optional[User]:
-        return self.db.query(User).filter(User.id == user_id).first()
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        """Merged with the other get_by_id calls on this session in the same loop iteration"""
+        return await self._loader().load(user_id)
+    
+    async def get_by_ids(self, user_ids: Iterable[int]) -> List[User]:
+        """Users with the given ids in one IN query, in no particular order"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        result = await self.db.scalars(select(User).where(User.id.in_(user_ids)))
+        return list(result.all())
+    
+    def _loader(self) -> DataLoader[int, User]:
+        # Kept on the session, so every repository of a request shares it
+        info = self.db.sync_session.info
+        loader = info.get("user_loader")
+        if loader is None:
+            loader = info["user_loader"] = DataLoader(self._load_batch)
+        return loader
+    
+    async def _load_batch(self, user_ids: List[int]) -> Dict[int, User]:
+        return {user.id: user for user in await self.get_by_ids(user_ids)}
+    
+    async def get_by_email(self, email: str) -> Optional[User]:
+        return await self.db.scalar(select(User).where(User.email == email))
+    
+    async def get_by_username(self, username: str) -> Optional[User]:
+        return await self.db.scalar(select(User).where(User.username == username))
+    
+    async def get_multi(self, skip: int = 0, limit: int = 100) -> List[User]:
+        result = await self.db.scalars(select(User).offset(skip).limit(limit))
+        return list(result.all())
+    
+    async def get_page(self, after_id: Optional[int] = None, limit: int = 100) -> List[User]:
+        """Keyset page ordered by id: a primary key seek, however deep the page"""
+        query = select(User).order_by(User.id).limit(limit)
+        if after_id is not None:
+            query = query.where(User.id > after_id)
+        result = await self.db.scalars(query)
+        return list(result.all())
+    
+    async def count(self, estimated: bool = False) -> int:
+        """Number of users; ``estimated`` reads the planner's row estimate
+        (pg_class.reltuples, maintained by VACUUM/ANALYZE) instead of scanning.
+        
+        Falls back to count(*) where there is no estimate: other databases and
+        tables Postgres has not analyzed yet.
+        """
+        if estimated and self._dialect().name == "postgresql":
+            estimate = await self.db.scalar(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": users_table.name},
+            )
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        return await self.db.scalar(select(func.count()).select_from(users_table))
     
-    def get_by_email(self, email: str) -> Optional[User]:
-        return self.db.query(User).filter(User.email == email).first()
+    async def search(
+        self, q: str, substring: bool = True, after: Optional[Tuple[int, int]] = None, limit: int = 100
+    ) -> List[Tuple[User, int]]:
+        """Users whose username or email contains ``q`` (only starts with it
+        when ``substring`` is False), case-insensitively, with their rank.
+        
+        Ranks: 0 exact match, 1 username prefix, 2 email prefix, 3 substring.
+        Ordered by (rank, id); ``after`` is the (rank, id) of the last row of
+        the previous page. The lower() expressions match the search indexes.
+        """
+        q = q.lower()
+        username, email = func.lower(User.username), func.lower(User.email)
+        prefix = _like_escape(q) + "%"
+        rank = case(
+            (or_(username == q, email == q), literal(0)),
+            (username.like(prefix, escape="\\"), literal(1)),
+            (email.like(prefix, escape="\\"), literal(2)),
+            else_=literal(3),
+        )
+        pattern = "%" + prefix if substring else prefix
+        query = (
+            select(User, rank.label("rank"))
+            .where(or_(username.like(pattern, escape="\\"), email.like(pattern, escape="\\")))
+            .order_by(rank, User.id)
+            .limit(limit)
+        )
+        if after is not None:
+            after_rank, after_id = after
+            query = query.where(or_(rank > after_rank, and_(rank == after_rank, User.id > after_id)))
+        result = await self.db.execute(query)
+        return [(user, user_rank) for user, user_rank in result.all()]
     
-    def get_by_username(self, username: str) -> Optional[User]:
-        return self.db.query(User).filter(User.username == username).first()
+    def _dialect(self) -> Any:
+        return self.db.get_bind().dialect
     
-    def get_multi(self, skip: int = 0, limit: int = 100) -> List[User]:
-        return self.db.query(User).offset(skip).limit(limit).all()
+    async def _fetch(self, user_id: int) -> Optional[User]:
+        row = (await self.db.execute(select(users_table).where(users_table.c.id == user_id))).first()
+        return _to_user(row) if row else None
     
-    def create(self, user_create: UserCreate) -> User:
-        db_user = User(
+    async def create(self, user_create: UserCreate) -> User:
+        """INSERT ... RETURNING in one statement; unique violations propagate as
+        IntegrityError after rolling back"""
+        hashed_password = await get_password_hash_async(user_create.password)
+        statement = insert(users_table).values(
             email=user_create.email,
             username=user_create.username,
-            hashed_password=get_password_hash(user_create.password),
+            hashed_password=hashed_password,
             is_active=user_create.is_active,
         )
-        self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
-        return db_user
+        try:
+            if self._dialect().insert_returning:
+                row = (await self.db.execute(statement.returning(*users_table.c))).one()
+                user = _to_user(row)
+            else:
+                result = await self.db.execute(statement)
+                user = await self._fetch(result.inserted_primary_key[0])
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise
+        await user_cache.invalidate_counts()
+        return user
     
-    def update(self, user: User, user_update: UserUpdate) -> User:
-        update_data = user_update.model_dump(exclude_unset=True)
+    async def stream_columns(self, columns: Sequence[str], batch_size: int = 1000) -> AsyncIterator[List[Any]]:
+        """Yield lists of row tuples from a server-side cursor, ordered by id.
         
+        Plain column tuples keep the identity map empty, so memory stays
+        flat no matter how many rows are read.
+        """
+        query = (
+            select(*(getattr(User, column) for column in columns))
+            .order_by(User.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.db.stream(query)
+        async for partition in result.partitions(batch_size):
+            yield partition
+    
+    async def get_existing_identities(
+        self, emails: Iterable[str], usernames: Iterable[str]
+    ) -> Tuple[Set[str], Set[str]]:
+        """Emails and usernames from the given sets that are already taken, in one query"""
+        result = await self.db.execute(
+            select(User.email, User.username).where(
+                or_(User.email.in_(list(emails)), User.username.in_(list(usernames)))
+            )
+        )
+        rows = result.all()
+        return {row.email for row in rows}, {row.username for row in rows}
+    
+    async def bulk_create(self, users: List[UserCreate]) -> List[int]:
+        """Insert users with one executemany and return the indexes of rows
+        rejected by a unique constraint"""
+        hashed_passwords = await get_password_hashes_bulk([user.password for user in users])
+        rows: List[Dict[str, Any]] = [
+            {
+                "email": user.email,
+                "username": user.username,
+                "hashed_password": hashed_password,
+                "is_active": user.is_active,
+            }
+            for user, hashed_password in zip(users, hashed_passwords)
+        ]
+        try:
+            await self.db.execute(insert(User), rows)
+            await self.db.commit()
+            await user_cache.invalidate_counts()
+            return []
+        except IntegrityError:
+            await self.db.rollback()
+        
+        # A concurrent writer took one of the identities, find it row by row
+        conflicts = []
+        for index, row in enumerate(rows):
+            try:
+                await self.db.execute(insert(User), [row])
+                await self.db.commit()
+            except IntegrityError:
+                await self.db.rollback()
+                conflicts.append(index)
+        await user_cache.invalidate_counts()
+        return conflicts
+    
+    async def update(
+        self, user_id: int, user_update: UserUpdate, expected_updated_at: Optional[datetime] = None
+    ) -> Optional[User]:
+        """UPDATE ... RETURNING; None when no user has this id or, if
+        ``expected_updated_at`` is given, when the row has changed since"""
+        update_data = user_update.model_dump(exclude_unset=True)
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
         
-        for field, value in update_data.items():
-            setattr(user, field, value)
+        # RETURNING only sees the new row, so a rename needs the old name for the cache
+        previous_username = None
+        if "username" in update_data:
+            previous = await self._fetch(user_id)
+            if previous is None:
+                return None
+            previous_username = previous.username
         
-        self.db.commit()
-        self.db.refresh(user)
+        revokes_tokens = not TOKEN_REVOKING_FIELDS.isdisjoint(update_data)
+        if revokes_tokens:
+            update_data["token_version"] = users_table.c.token_version + 1
+        
+        statement = update(users_table).where(users_table.c.id == user_id).values(**update_data)
+        if expected_updated_at is not None:
+            statement = statement.where(users_table.c.updated_at == expected_updated_at)
+        try:
+            if not update_data:
+                user = await self._fetch(user_id)
+                if user is not None and expected_updated_at is not None and user.updated_at != expected_updated_at:
+                    user = None
+            elif self._dialect().update_returning:
+                row = (await self.db.execute(statement.returning(*users_table.c))).first()
+                user = _to_user(row) if row else None
+            else:
+                result = await self.db.execute(statement)
+                user = await self._fetch(user_id) if result.rowcount else None
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise
+        
+        if user is not None:
+            await principal_cache.invalidate(*{previous_username or user.username, user.username})
+            if revokes_tokens:
+                token_revocations.revoke(user.id, user.token_version)
         return user
     
-    def delete(self, user: User) -> None:
-        self.db.delete(user)
-        self.db.commit()
+    async def delete(self, user_id: int) -> bool:
+        """DELETE ... RETURNING; False when no user has this id"""
+        statement = delete(users_table).where(users_table.c.id == user_id)
+        if self._dialect().delete_returning:
+            username = (await self.db.execute(statement.returning(users_table.c.username))).scalar()
+        else:
+            username = (await self.db.execute(
+                select(users_table.c.username).where(users_table.c.id == user_id)
+            )).scalar()
+            if username is not None:
+                await self.db.execute(statement)
+        await self.db.commit()
+        
+        if username is None:
+            return False
+        await principal_cache.invalidate(username)
+        await user_cache.invalidate_counts()
+        token_revocations.revoke(user_id)
+        return True
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, field_validator
 from datetime import datetime
-from typing import Optional
-from app.utils.helpers import is_strong_password, sanitize_string, format_datetime
+from typing import Any, List, Optional
+from app.utils.helpers import is_strong_password, sanitize_string
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -28,14 +28,22 @@ class UserCreate(UserBase):
 
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
-    username: Optional[str] = None
+    username: Optional[str] = Field(None, min_length=3, max_length=50)
     password: Optional[str] = None
     is_active: Optional[bool] = None
     
+    @field_validator('email', 'username', 'password', 'is_active', mode='before')
+    @classmethod
+    def reject_null(cls, v: Any) -> Any:
+        # Omitting a field leaves it unchanged; the columns are NOT NULL
+        if v is None:
+            raise ValueError('Field may be omitted but not null')
+        return v
+    
     @field_validator('username')
     @classmethod
-    def sanitize_username(cls, v: Optional[str]) -> Optional[str]:
-        return sanitize_string(v) if v else None
+    def sanitize_username(cls, v: str) -> str:
+        return sanitize_string(v)
     
     @field_validator('password')
     @classmethod
@@ -57,16 +65,40 @@ class UserInDB(UserBase):
     class Config:
         from_attributes = True
 
-class UserResponse(UserBase):
+class UserResponse(BaseModel):
+    # Output only: rows were validated on the way in, so skip the email and
+    # username validators of UserBase, which dominate list serialization
+    email: str = Field(..., json_schema_extra={"format": "email"})
+    username: str
+    is_active: bool
     id: int
     is_superuser: bool
     created_at: datetime
     
     class Config:
         from_attributes = True
-        json_encoders = {
-            datetime: format_datetime
-        }
+
+# Built once: validates a whole list of ORM rows in a single pydantic-core call
+UserResponseList = TypeAdapter(List[UserResponse])
+# GET /users/batch: one entry per requested id, null where no user has it
+UserResponseBatch = TypeAdapter(List[Optional[UserResponse]])
+
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+    # Only when requested with ?total=exact|estimated
+    total: Optional[int] = None
+
+class UserImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+class UserImportReport(BaseModel):
+    created: int = 0
+    failed: int = 0
+    errors: List[UserImportError] = []
+    # Only the first BULK_IMPORT_MAX_ERRORS failures are listed
+    errors_truncated: bool = False
 
 class Token(BaseModel):
     access_token: str
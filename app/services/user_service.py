@@ -1,46 +1,248 @@
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from app.repositories.user_repo import UserRepository
-from app.schemas.user import UserCreate, UserUpdate, UserResponse
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, ContextManager, Literal, Optional, List, Tuple
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.core.database import DBSession
+from app.core.replicas import primary_reads
+from app.core.user_cache import Payload, user_cache
+from app.repositories.user_repo import UserRepository, unique_violation_field
+from app.schemas.user import (
+    UserCreate, UserUpdate, UserResponse, UserResponseList, UserResponseBatch, UserPage, UserImportError,
+    UserImportReport
+)
 from app.models.user import User
-from app.utils.exceptions import NotFoundException, ConflictException
+from app.utils.exceptions import (
+    NotFoundException, ConflictException, BadRequestException, PreconditionFailedException,
+    UnprocessableEntityException
+)
+from app.utils.etag import make_etag, parse_etag
+from app.utils.helpers import encode_cursor, decode_cursor
+from app.utils.responses import ModelResponse
+from app.utils.singleflight import SingleFlight
+from app.utils.streaming import Record, csv_chunks, ndjson_chunks
+
+# Read-only methods returning serialized bodies, safe to share between requests
+user_reads = SingleFlight("user_reads", enabled=settings.SINGLE_FLIGHT_ENABLED)
+
+CONFLICT_MESSAGES = {
+    "email": "Email already registered",
+    "username": "Username already taken",
+}
+
+def _integrity_error(exc: IntegrityError) -> HTTPException:
+    """409 for a taken email or username; any other constraint means invalid data"""
+    field = unique_violation_field(exc)
+    if field is None:
+        return UnprocessableEntityException("User data violates a database constraint")
+    return ConflictException(CONFLICT_MESSAGES[field])
 
 class UserService:
-    def __init__(self, db: Session):
+    def __init__(self, db: DBSession):
         self.repository = UserRepository(db)
     
-    def create_user(self, user_create: UserCreate) -> UserResponse:
-        # Check if user already exists
-        if self.repository.get_by_email(user_create.email):
-            raise ConflictException("Email already registered")
-        
-        if self.repository.get_by_username(user_create.username):
-            raise ConflictException("Username already taken")
-        
-        user = self.repository.create(user_create)
+    def _cache_fill(self) -> ContextManager[Any]:
+        # Rows read for the cache come from the primary: a lagging replica would
+        # put back what a write has just invalidated
+        return primary_reads(self.repository.db) if user_cache.enabled else nullcontext()
+    
+    async def create_user(self, user_create: UserCreate) -> UserResponse:
+        # Uniqueness is enforced by the constraints, not a SELECT per field
+        try:
+            user = await self.repository.create(user_create)
+        except IntegrityError as exc:
+            raise _integrity_error(exc)
+        await user_cache.invalidate()
         return UserResponse.model_validate(user)
     
-    def get_user(self, user_id: int) -> UserResponse:
-        user = self.repository.get_by_id(user_id)
+    async def get_user(self, user_id: int) -> User:
+        """The row itself, so callers can check its ETag before serializing"""
+        user = await self.repository.get_by_id(user_id)
         if not user:
             raise NotFoundException("User not found")
-        return UserResponse.model_validate(user)
+        return user
     
-    def get_users(self, skip: int = 0, limit: int = 100) -> List[UserResponse]:
-        users = self.repository.get_multi(skip=skip, limit=limit)
-        return [UserResponse.model_validate(user) for user in users]
+    async def get_user_json(self, user_id: int) -> Payload:
+        """Serialized UserResponse and its ETag, through the read-through cache"""
+        async def load() -> Payload:
+            with self._cache_fill():
+                user = await self.get_user(user_id)
+            return ModelResponse(UserResponse.model_validate(user)).body, make_etag(user.id, user.updated_at)
+        return await user_reads.do(("user", user_id), lambda: user_cache.get_user(user_id, load))
     
-    def update_user(self, user_id: int, user_update: UserUpdate) -> UserResponse:
-        user = self.repository.get_by_id(user_id)
-        if not user:
-            raise NotFoundException("User not found")
+    async def get_users_by_ids(self, user_ids: List[int]) -> List[Optional[UserResponse]]:
+        """One entry per requested id, in request order; None for unknown ids"""
+        users = {user.id: user for user in await self.repository.get_by_ids(set(user_ids))}
+        return UserResponseBatch.validate_python(
+            [users.get(user_id) for user_id in user_ids], from_attributes=True
+        )
+    
+    async def get_users(self, skip: int = 0, limit: int = 100) -> List[UserResponse]:
+        users = await self.repository.get_multi(skip=skip, limit=limit)
+        return UserResponseList.validate_python(users, from_attributes=True)
+    
+    async def get_users_json(self, skip: int = 0, limit: int = 100) -> bytes:
+        """Serialized list of UserResponse, through the read-through cache"""
+        async def load() -> Payload:
+            with self._cache_fill():
+                users = await self.get_users(skip=skip, limit=limit)
+            return ModelResponse(users, adapter=UserResponseList).body, ""
+        body, _ = await user_reads.do(("users", skip, limit), lambda: user_cache.get_list(skip, limit, load))
+        return body
+    
+    async def count_users(self, mode: Literal["exact", "estimated"] = "exact") -> int:
+        """Total number of users, cached until a user is created or deleted"""
+        async def load() -> Payload:
+            with self._cache_fill():
+                count = await self.repository.count(estimated=mode == "estimated")
+            return str(count).encode(), ""
+        body, _ = await user_reads.do(("count", mode), lambda: user_cache.get_count(mode, load))
+        return int(body)
+    
+    async def get_users_page(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        total: Optional[Literal["exact", "estimated"]] = None
+    ) -> UserPage:
+        after_id = None
+        if cursor:
+            state = decode_cursor(cursor)
+            if state is None or not isinstance(state.get("id"), int):
+                raise BadRequestException("Invalid cursor")
+            after_id = state["id"]
+        
+        # Fetch one extra row to know whether another page exists
+        users = await self.repository.get_page(after_id=after_id, limit=limit + 1)
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor({"id": users[-1].id})
         
-        updated_user = self.repository.update(user, user_update)
-        return UserResponse.model_validate(updated_user)
+        return UserPage(
+            items=UserResponseList.validate_python(users, from_attributes=True),
+            next_cursor=next_cursor,
+            total=await self.count_users(total) if total else None
+        )
     
-    def delete_user(self, user_id: int) -> None:
-        user = self.repository.get_by_id(user_id)
-        if not user:
+    async def search_users(self, q: str, cursor: Optional[str] = None, limit: int = 100) -> UserPage:
+        """Users matching ``q`` best match first; queries shorter than
+        USER_SEARCH_MIN_SUBSTRING_LENGTH only match prefixes"""
+        q = q.strip()
+        if not q:
+            raise BadRequestException("Search query is empty")
+        after = None
+        if cursor:
+            state = decode_cursor(cursor)
+            if (
+                state is None or state.get("q") != q
+                or not isinstance(state.get("rank"), int) or not isinstance(state.get("id"), int)
+            ):
+                raise BadRequestException("Invalid cursor")
+            after = (state["rank"], state["id"])
+        
+        substring = len(q) >= settings.USER_SEARCH_MIN_SUBSTRING_LENGTH
+        rows = await self.repository.search(q, substring=substring, after=after, limit=limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_user, last_rank = rows[-1]
+            next_cursor = encode_cursor({"q": q, "rank": last_rank, "id": last_user.id})
+        
+        return UserPage(
+            items=UserResponseList.validate_python([user for user, _ in rows], from_attributes=True),
+            next_cursor=next_cursor
+        )
+    
+    def export_users(self, format: str = "ndjson") -> AsyncIterator[bytes]:
+        """Stream every user as NDJSON or CSV, one chunk per cursor batch"""
+        fields = list(UserResponse.model_fields)
+        partitions = self.repository.stream_columns(fields, batch_size=settings.EXPORT_BATCH_SIZE)
+        if format == "csv":
+            return csv_chunks(fields, partitions)
+        return ndjson_chunks(fields, partitions)
+    
+    async def update_user(self, user_id: int, user_update: UserUpdate, if_match: Optional[str] = None) -> User:
+        """Update a user; with an If-Match ETag only if the row is unchanged since"""
+        expected_updated_at = None
+        if if_match and if_match.strip() != "*":
+            version = parse_etag(if_match)
+            if version is None or version[0] != user_id:
+                raise PreconditionFailedException("ETag does not match this user")
+            expected_updated_at = version[1]
+        
+        try:
+            updated_user = await self.repository.update(user_id, user_update, expected_updated_at)
+        except IntegrityError as exc:
+            raise _integrity_error(exc)
+        if not updated_user:
+            if expected_updated_at is not None and await self.repository.get_by_id(user_id):
+                raise PreconditionFailedException("User was modified since it was read")
+            raise NotFoundException("User not found")
+        await user_cache.invalidate(user_id)
+        return updated_user
+    
+    async def delete_user(self, user_id: int) -> None:
+        if not await self.repository.delete(user_id):
             raise NotFoundException("User not found")
+        await user_cache.invalidate(user_id)
+    
+    async def import_users(self, records: AsyncIterator[Record]) -> UserImportReport:
+        """Validate and insert streamed records in batches of BULK_IMPORT_BATCH_SIZE"""
+        report = UserImportReport()
+        batch: List[Tuple[int, UserCreate]] = []
         
-        self.repository.delete(user)
+        async for row, record in records:
+            if isinstance(record, str):
+                self._add_import_error(report, row, [record])
+                continue
+            try:
+                batch.append((row, UserCreate.model_validate(record)))
+            except ValidationError as exc:
+                self._add_import_error(report, row, [
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                    for error in exc.errors()
+                ])
+                continue
+            
+            if len(batch) >= settings.BULK_IMPORT_BATCH_SIZE:
+                await self._import_batch(batch, report)
+                batch = []
+        
+        if batch:
+            await self._import_batch(batch, report)
+        return report
+    
+    async def _import_batch(self, batch: List[Tuple[int, UserCreate]], report: UserImportReport) -> None:
+        taken_emails, taken_usernames = await self.repository.get_existing_identities(
+            {user.email for _, user in batch}, {user.username for _, user in batch}
+        )
+        
+        accepted: List[Tuple[int, UserCreate]] = []
+        for row, user in batch:
+            # Earlier rows of the same upload count as taken too
+            if user.email in taken_emails:
+                self._add_import_error(report, row, ["Email already registered"])
+            elif user.username in taken_usernames:
+                self._add_import_error(report, row, ["Username already taken"])
+            else:
+                taken_emails.add(user.email)
+                taken_usernames.add(user.username)
+                accepted.append((row, user))
+        
+        if not accepted:
+            return
+        conflicts = await self.repository.bulk_create([user for _, user in accepted])
+        for index in conflicts:
+            self._add_import_error(report, accepted[index][0], ["Email or username already taken"])
+        report.created += len(accepted) - len(conflicts)
+        await user_cache.invalidate()
+    
+    @staticmethod
+    def _add_import_error(report: UserImportReport, row: int, errors: List[str]) -> None:
+        report.failed += 1
+        if len(report.errors) < settings.BULK_IMPORT_MAX_ERRORS:
+            report.errors.append(UserImportError(row=row, errors=errors))
+        else:
+            report.errors_truncated = True
\ No newline at end of file
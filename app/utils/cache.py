@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+class TTLCache(Generic[V]):
+    """Bounded LRU mapping whose entries also expire after a time-to-live.
+
+    Every operation is O(1): the OrderedDict keeps entries in recency order,
+    so the least recently used key is evicted once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None, now: Optional[float] = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= (time.monotonic() if now is None else now):
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
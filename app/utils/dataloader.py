@@ -0,0 +1,65 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Mapping, Optional, Set, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+BatchFn = Callable[[List[K]], Awaitable[Mapping[K, V]]]
+
+class DataLoader(Generic[K, V]):
+    """Coalesce ``load(key)`` calls made in the same event loop iteration.
+
+    Keys requested before the loop gets around to the scheduled dispatch are
+    fetched with one ``batch_fn(keys)`` call, which returns a mapping of the
+    keys it found; missing keys resolve to None. Batches run one at a time,
+    so a loader bound to a session never uses it concurrently. Nothing is
+    cached between batches.
+    """
+
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int = 1000):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[K, List["asyncio.Future[Optional[V]]"]] = {}
+        self._lock = asyncio.Lock()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.stats = {"loads": 0, "batches": 0}
+
+    async def load(self, key: K) -> Optional[V]:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Optional[V]]" = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._dispatch)
+        self._pending.setdefault(key, []).append(future)
+        self.stats["loads"] += 1
+        return await future
+
+    async def load_many(self, keys: List[K]) -> List[Optional[V]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._run(pending))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: Dict[K, List["asyncio.Future[Optional[V]]"]]) -> None:
+        keys = list(pending)
+        async with self._lock:
+            for i in range(0, len(keys), self.max_batch_size):
+                batch = keys[i:i + self.max_batch_size]
+                self.stats["batches"] += 1
+                try:
+                    results = await self.batch_fn(batch)
+                except BaseException as exc:
+                    for key in keys[i:]:
+                        for future in pending[key]:
+                            if not future.done():
+                                future.set_exception(exc)
+                    if isinstance(exc, asyncio.CancelledError):
+                        raise
+                    return
+                for key in batch:
+                    for future in pending[key]:
+                        if not future.done():
+                            future.set_result(results.get(key))
@@ -0,0 +1,53 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+EPOCH = datetime(1970, 1, 1)
+
+# Exactly what make_etag writes, so every accepted ETag round-trips
+ETAG_VALUE = re.compile(r'"([0-9]+)-([0-9a-f]+)"')
+
+def _naive_utc(value: datetime) -> datetime:
+    # Columns are "timestamp without time zone" holding UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def make_etag(resource_id: int, updated_at: Optional[datetime]) -> str:
+    """Strong ETag encoding the id and exact updated_at, so it can be turned back into a WHERE clause"""
+    micros = 0
+    if updated_at is not None:
+        delta = _naive_utc(updated_at) - EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f'"{resource_id}-{micros:x}"'
+
+def parse_etag(etag: str) -> Optional[Tuple[int, datetime]]:
+    """(id, updated_at) from a value produced by make_etag, or None.
+    
+    A well-formed ETag always carries a timestamp (the epoch for 0), so an
+    If-Match can never turn into "no precondition".
+    """
+    match = ETAG_VALUE.fullmatch(etag.strip())
+    if match is None:
+        return None
+    try:
+        updated_at = EPOCH + timedelta(microseconds=int(match.group(2), 16))
+    except (OverflowError, ValueError):
+        return None
+    return int(match.group(1)), updated_at
+
+def etag_in(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Whether an If-None-Match (weak comparison) or If-Match (strong) header matches"""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -22,4 +22,28 @@ class ForbiddenException(HTTPException):
 
 class ConflictException(HTTPException):
     def __init__(self, detail: str = "Resource conflict"):
-        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+class PreconditionFailedException(HTTPException):
+    def __init__(self, detail: str = "Precondition failed"):
+        super().__init__(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=detail)
+
+class UnprocessableEntityException(HTTPException):
+    def __init__(self, detail: str = "Unprocessable entity"):
+        super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+class TooManyRequestsException(HTTPException):
+    def __init__(self, detail: str = "Too many requests", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(self, detail: str = "Service unavailable", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)}
+        )
\ No newline at end of file
@@ -0,0 +1,147 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple
+
+class ExecutorSaturated(RuntimeError):
+    """Raised instead of queueing when a BoundedExecutor is full"""
+
+
+def _timed_call(fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[float, float, Any]:
+    # Runs in the worker; CLOCK_MONOTONIC is shared by every process on the host
+    started_at = time.monotonic()
+    result = fn(*args)
+    return started_at, time.monotonic(), result
+
+
+def _map_chunk(fn: Callable[..., Any], items: Sequence[Any]) -> List[Any]:
+    return [fn(item) for item in items]
+
+
+class BoundedExecutor:
+    """Dedicated thread or process pool with a bounded queue in front of it.
+
+    At most ``max_workers + max_queue`` calls are in flight; further calls
+    fail fast with ExecutorSaturated so callers can shed load instead of
+    piling up behind CPU-bound work, or with ``wait_for_capacity`` wait
+    (in arrival order) until a call finishes.
+
+    Process pools start their workers with forkserver (spawn where that is
+    unavailable): forking a process that already runs threads can copy locks
+    held by those threads into the child.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: Optional[int] = None,
+        max_queue: int = 64,
+        name: str = "executor",
+        observer: Optional[Callable[[Callable[..., Any], float, float], None]] = None,
+        wait_for_capacity: bool = False,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind '{kind}'")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.name = name
+        # Called with (fn, wait_seconds, run_seconds) after every call
+        self.observer = observer
+        self.wait_for_capacity = wait_for_capacity
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self.stats = {
+            "completed": 0,
+            "rejected": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls submitted but not yet picked up by a worker"""
+        return max(0, self._in_flight - self.max_workers)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing the app never forks or spawns threads
+        if self._executor is None:
+            if self.kind == "process":
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context(method)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def _wait_for_slot(self) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            # Pass on a slot handed to us just before we were cancelled
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter, so _in_flight stays as it is
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        submitted_at = time.monotonic()
+        if self._in_flight >= self.max_workers + self.max_queue or self._waiters:
+            if not self.wait_for_capacity:
+                self.stats["rejected"] += 1
+                raise ExecutorSaturated(f"{self.name} queue is full")
+            await self._wait_for_slot()
+        else:
+            self._in_flight += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            started_at, finished_at, result = await loop.run_in_executor(
+                self._get_executor(), _timed_call, fn, args
+            )
+        finally:
+            self._release_slot()
+
+        wait = max(0.0, started_at - submitted_at)
+        self.stats["completed"] += 1
+        self.stats["wait_seconds_total"] += wait
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait)
+        if self.observer is not None:
+            self.observer(fn, wait, finished_at - started_at)
+        return result
+
+    async def map(self, fn: Callable[[Any], Any], items: Sequence[Any]) -> List[Any]:
+        """Apply ``fn`` to every item, submitting one chunk of items per worker"""
+        if not items:
+            return []
+        size = -(-len(items) // self.max_workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        results = await asyncio.gather(*(self.run(_map_chunk, fn, chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,5 +1,8 @@
 from typing import Any, Dict, Optional
 from datetime import datetime
+import base64
+import binascii
+import json
 import re
 
 def is_valid_email(email: str) -> bool:
@@ -32,4 +35,18 @@ def parse_datetime(dt_str: str) -> Optional[datetime]:
     try:
         return datetime.fromisoformat(dt_str)
     except ValueError:
-        return None
\ No newline at end of file
+        return None
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """Encode pagination state as an opaque URL-safe cursor"""
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+    """Decode a cursor produced by encode_cursor, None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
\ No newline at end of file
@@ -1,28 +1,122 @@
+import atexit
+import json
 import logging
+import os
+import queue
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# One listener thread per destination, shared by every logger writing there
+_listeners: Dict[Optional[str], QueueListener] = {}
+# The handlers feeding each listener, repointed when its queue is replaced
+_queue_handlers: Dict[Optional[str], List["LazyQueueHandler"]] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON objects, including ``extra`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueue records untouched so message formatting happens on the listener thread.
+
+    The stock QueueHandler formats every record on the calling thread, which
+    puts string interpolation back on the event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _make_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def _get_listener(log_file: Optional[str]) -> QueueListener:
+    listener = _listeners.get(log_file)
+    if listener is None:
+        formatter = _make_formatter()
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if log_file:
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            handlers.append(logging.FileHandler(log_file))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        listener = _start_listener(handlers)
+        _listeners[log_file] = listener
+        _queue_handlers[log_file] = []
+    return listener
+
+
+def _start_listener(handlers: List[logging.Handler]) -> QueueListener:
+    listener = QueueListener(queue.SimpleQueue(), *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
 
 def setup_logger(name: str, log_file: Optional[str] = None) -> logging.Logger:
-    """Setup logger with console and file handlers"""
+    """Setup logger writing to the console and an optional file via a background thread.
+
+    Calling it again for the same logger is a no-op.
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_format = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    console_handler.setFormatter(console_format)
-    logger.addHandler(console_handler)
-    
-    # File handler (optional)
-    if log_file:
-        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(console_format)
-        logger.addHandler(file_handler)
+    logger.setLevel(settings.LOG_LEVEL)
+    if any(isinstance(handler, LazyQueueHandler) for handler in logger.handlers):
+        return logger
+
+    handler = LazyQueueHandler(_get_listener(log_file).queue)
+    _queue_handlers[log_file].append(handler)
+    logger.addHandler(handler)
+    return logger
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener threads"""
+    _queue_handlers.clear()
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def _restart_listeners_after_fork() -> None:
+    """Listener threads do not survive fork(); give the child its own.
     
-    return logger
\ No newline at end of file
+    Each inherited listener is stopped (its thread is already dead in the
+    child, so this only posts the sentinel) and replaced by a new one on a
+    fresh queue. Records left in the inherited queue are the parent's to
+    write, so the child simply drops that queue.
+    """
+    for log_file, inherited in list(_listeners.items()):
+        inherited.stop()
+        listener = _start_listener(list(inherited.handlers))
+        _listeners[log_file] = listener
+        for handler in _queue_handlers[log_file]:
+            handler.queue = listener.queue
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_listeners_after_fork)
@@ -0,0 +1,36 @@
+from typing import Any, Callable, Optional
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from app.utils.etag import etag_in
+
+class ModelResponse(ORJSONResponse):
+    """JSON response for values the service layer has already validated.
+
+    Returning a Response from an endpoint bypasses FastAPI's ``response_model``
+    handling, which would otherwise dump, re-validate and re-encode the models;
+    ``response_model`` then only documents the schema. Models are dumped in
+    python mode so orjson encodes datetimes natively.
+    """
+
+    def __init__(self, content: Any, adapter: Optional[TypeAdapter] = None, **kwargs: Any):
+        if adapter is not None:
+            content = adapter.dump_python(content)
+        elif isinstance(content, BaseModel):
+            content = content.model_dump()
+        super().__init__(content, **kwargs)
+
+def conditional_response(request: Request, etag: str, build: Callable[[], Any]) -> Response:
+    """304 when If-None-Match already has ``etag``; otherwise ``build()`` the body.
+
+    ``build`` is only called on a miss, so unchanged resources skip validation
+    and serialization entirely. It may also return an already serialized JSON
+    body (e.g. from the user cache), which is sent as is.
+    """
+    headers = {"ETag": etag}
+    if etag_in(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    content = build()
+    if isinstance(content, bytes):
+        return Response(content, media_type="application/json", headers=headers)
+    return ModelResponse(content, headers=headers)
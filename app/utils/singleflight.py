@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+from app.core.metrics import SINGLE_FLIGHT_CALLS
+
+T = TypeVar("T")
+
+def _consume_exception(future: "asyncio.Future[Any]") -> None:
+    # Followers may all have gone; keep asyncio from logging an unretrieved error
+    if not future.cancelled():
+        future.exception()
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key.
+
+    The first caller (the leader) runs ``fn``; callers arriving while it is
+    still running await the leader's result or exception instead of running
+    their own. Nothing is kept once the call completes, so unlike a cache it
+    never serves data older than the call it joined. If the leader is
+    cancelled, waiting callers run the call themselves.
+
+    Results are shared between callers and must not be mutated (bytes,
+    frozen models).
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.stats = {"leaders": 0, "shared": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            return await fn()
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats["shared"] += 1
+            SINGLE_FLIGHT_CALLS.labels(self.name, "shared").inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # This caller was cancelled, not the leader
+                    raise
+            return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._in_flight[key] = future
+        self.stats["leaders"] += 1
+        SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+# (1-based row number, parsed record or a parse error message)
+Record = Tuple[int, Union[Dict[str, Any], str]]
+
+MAX_LINE_BYTES = 64 * 1024
+
+def _decode(line: bytes) -> str:
+    return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+def _too_long(max_line_bytes: int) -> str:
+    return f"Line longer than {max_line_bytes} bytes"
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Optional[str]]:
+    """Split a byte stream into decoded lines, holding at most one partial line.
+    
+    A line longer than ``max_line_bytes`` is dropped up to the next newline
+    and yielded as None, so memory stays bounded whatever the upload.
+    """
+    parts: List[bytes] = []
+    size = 0
+    skipping = False
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            piece = chunk[start:] if end == -1 else chunk[start:end]
+            if not skipping:
+                if size + len(piece) > max_line_bytes:
+                    skipping = True
+                    parts, size = [], 0
+                    yield None
+                elif piece:
+                    parts.append(piece)
+                    size += len(piece)
+            if end == -1:
+                break
+            if not skipping:
+                yield _decode(b"".join(parts))
+            parts, size, skipping = [], 0, False
+            start = end + 1
+    if size:
+        yield _decode(b"".join(parts))
+
+async def iter_ndjson_records(chunks: AsyncIterable[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Record]:
+    """Parse newline-delimited JSON objects, skipping blank lines"""
+    row = 0
+    async for line in iter_lines(chunks, max_line_bytes):
+        if line is None:
+            row += 1
+            yield row, _too_long(max_line_bytes)
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, "Invalid JSON"
+            continue
+        yield row, record if isinstance(record, dict) else "Expected a JSON object"
+
+async def iter_csv_records(chunks: AsyncIterable[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Record]:
+    """Parse CSV with a header row; each record must fit on one line"""
+    header = None
+    row = 0
+    async for line in iter_lines(chunks, max_line_bytes):
+        if line is None:
+            row += 1
+            if header is None:
+                # Without the header no later row can be read
+                yield row, f"Header {_too_long(max_line_bytes).lower()}"
+                return
+            yield row, _too_long(max_line_bytes)
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells fall back to the schema defaults
+        yield row, {name: value for name, value in zip(header, values) if value != ""}
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def ndjson_chunks(fields: Sequence[str], partitions: AsyncIterable[Sequence[Sequence[Any]]]) -> AsyncIterator[bytes]:
+    """Serialize each partition of row tuples as one chunk of NDJSON"""
+    async for rows in partitions:
+        yield "".join(
+            json.dumps(dict(zip(fields, row)), default=_json_default) + "\n" for row in rows
+        ).encode()
+
+async def csv_chunks(fields: Sequence[str], partitions: AsyncIterable[Sequence[Sequence[Any]]]) -> AsyncIterator[bytes]:
+    """Serialize a header and then each partition of row tuples as one chunk of CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue().encode()
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+        yield buffer.getvalue().encode()
\ No newline at end of file
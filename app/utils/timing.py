@@ -0,0 +1,22 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+class PhaseTimer:
+    """Wall time of named phases, e.g. the steps of application startup"""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    @property
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
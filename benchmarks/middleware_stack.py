@@ -0,0 +1,131 @@
+"""Micro-benchmark of the HTTP middleware stack: BaseHTTPMiddleware vs pure ASGI.
+
+Builds two otherwise identical apps with the rate limiter, metrics and
+access log middlewares. The "before" app wraps equivalent dispatch functions
+in ``BaseHTTPMiddleware`` the way ``app.middleware("http")`` used to; the
+"after" app uses the ASGI classes from ``app.middleware``. Requests are
+sent in-process through httpx so only the application stack is measured.
+
+    python -m benchmarks.middleware_stack --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import math
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.rate_limit import MemoryBackend, TokenBucket
+from app.middleware.access_log import AccessLogger
+from app.middleware.metrics import PrometheusMiddleware, _route_template
+from app.middleware.rate_limiter import RateLimiter
+from app.core.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_PROGRESS
+
+# Records are built and filtered exactly as in production, but not written
+logger = logging.getLogger("benchmarks.access")
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+def make_backend() -> MemoryBackend:
+    return MemoryBackend(TokenBucket(limit=10**9, window=60))
+
+
+def add_endpoint(app: FastAPI) -> FastAPI:
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": item_id}
+
+    return app
+
+
+def legacy_app() -> FastAPI:
+    app = add_endpoint(FastAPI())
+    backend = make_backend()
+
+    async def rate_limit(request: Request, call_next):
+        result = await backend.hit(request.client.host if request.client else "unknown")
+        if not result.allowed:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(result.retry_after)))},
+            )
+        return await call_next(request)
+
+    async def metrics(request: Request, call_next):
+        route = _route_template(request.scope)
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(request.method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        response = await call_next(request)
+        in_progress.dec()
+        HTTP_REQUEST_DURATION.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - start
+        )
+        return response
+
+    async def access_log(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        logger.info(
+            "%s %s %s", request.method, request.url.path, response.status_code,
+            extra={"duration_ms": round((time.perf_counter() - start) * 1000, 3)},
+        )
+        return response
+
+    for dispatch in (rate_limit, metrics, access_log):
+        app.add_middleware(BaseHTTPMiddleware, dispatch=dispatch)
+    return app
+
+
+def asgi_app() -> FastAPI:
+    app = add_endpoint(FastAPI())
+    app.add_middleware(RateLimiter, backend=make_backend())
+    app.add_middleware(PrometheusMiddleware)
+    app.add_middleware(AccessLogger, logger=logger)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    """Requests per second for ``requests`` GETs spread over ``concurrency`` clients"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/items/0")  # warm up routing and metric children
+
+        async def worker(count: int) -> None:
+            for i in range(count):
+                response = await client.get(f"/items/{i}")
+                assert response.status_code == 200
+
+        per_worker = requests // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+        return per_worker * concurrency / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for name, factory in (("base_http_middleware", legacy_app), ("pure_asgi", asgi_app)):
+        # Best of several rounds to damp scheduler noise
+        results[name] = max(
+            asyncio.run(run(factory(), args.requests, args.concurrency)) for _ in range(args.rounds)
+        )
+        print(f"{name:>22}: {results[name]:10.1f} req/s")
+    speedup = results["pure_asgi"] / results["base_http_middleware"]
+    print(f"{'speedup':>22}: {speedup:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Worker memory and boot time under gunicorn, with and without preload_app.
+
+Starts gunicorn with gunicorn.conf.py twice (GUNICORN_PRELOAD=false, then
+true) against a throwaway SQLite file, waits until every worker has
+finished its lifespan startup and then reads /proc/<pid>/smaps_rollup of
+the master and the workers:
+
+- RSS counts every resident page, shared or not, so it barely moves.
+- PSS splits shared pages between the processes that map them, so the sum
+  over all processes is the real memory cost of the deployment.
+- USS (private pages) is what each worker adds on its own.
+
+Linux only (smaps_rollup, /proc/<pid>/task/<pid>/children).
+
+    python -m benchmarks.preload_report
+    python -m benchmarks.preload_report --workers 8 --output preload.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+READY_LINE = "Application startup complete"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    fields: Dict[str, int] = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        fields[name] = int(value.split()[0])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def children(pid: int) -> List[int]:
+    return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+
+
+def measure(preload: bool, workers: int, timeout: float) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "GUNICORN_PRELOAD": "true" if preload else "false",
+            "WEB_CONCURRENCY": str(workers),
+            "BIND": f"127.0.0.1:{free_port()}",
+            "DATABASE_URL": f"sqlite:///{tmp}/preload.db",
+            "PROMETHEUS_MULTIPROC_DIR": f"{tmp}/metrics",
+            "DB_SCHEMA_STARTUP": "create_all",
+            "SECRET_KEY": os.environ.get("SECRET_KEY", "preload-report-secret-key"),
+            "LOG_LEVEL": "WARNING",
+        }
+        start = time.perf_counter()
+        master = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        ready = threading.Semaphore(0)
+
+        def watch() -> None:
+            for line in master.stderr:
+                if READY_LINE in line:
+                    ready.release()
+
+        threading.Thread(target=watch, daemon=True).start()
+        try:
+            deadline = start + timeout
+            for _ in range(workers):
+                if not ready.acquire(timeout=max(0.0, deadline - time.perf_counter())):
+                    raise RuntimeError(f"workers did not start within {timeout}s (preload={preload})")
+            boot_seconds = time.perf_counter() - start
+
+            worker_memory = [memory_kb(pid) for pid in children(master.pid)]
+            master_memory = memory_kb(master.pid)
+        finally:
+            master.terminate()
+            master.wait(timeout=30)
+
+    def mean(key: str) -> int:
+        return round(sum(memory[key] for memory in worker_memory) / len(worker_memory))
+
+    return {
+        "preload": preload,
+        "workers": len(worker_memory),
+        "boot_seconds": round(boot_seconds, 2),
+        "worker_rss_kb": mean("rss"),
+        "worker_pss_kb": mean("pss"),
+        "worker_uss_kb": mean("uss"),
+        "master_rss_kb": master_memory["rss"],
+        "total_pss_kb": master_memory["pss"] + sum(memory["pss"] for memory in worker_memory),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for all workers")
+    parser.add_argument("--output", type=Path, help="also write the results to a JSON file")
+    args = parser.parse_args()
+
+    results = [measure(preload, args.workers, args.timeout) for preload in (False, True)]
+    columns = list(results[0])
+    print("  ".join(f"{column:>14}" for column in columns))
+    for result in results:
+        print("  ".join(f"{str(result[column]):>14}" for column in columns))
+
+    before, after = results
+    print(
+        f"\npreload: total PSS {after['total_pss_kb'] / before['total_pss_kb'] - 1:+.0%}, "
+        f"per-worker USS {after['worker_uss_kb'] / before['worker_uss_kb'] - 1:+.0%}, "
+        f"boot time {after['boot_seconds'] / before['boot_seconds'] - 1:+.0%}"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
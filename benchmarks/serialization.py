@@ -0,0 +1,109 @@
+"""Per-request CPU of the user read endpoints: FastAPI response_model vs the fast path.
+
+The "before" app mirrors the previous code: the service validates every row
+with the old ``UserResponse`` (which re-ran the UserBase email and username
+validators), then FastAPI validates and encodes the result again through
+``response_model`` and the ``json_encoders`` config. The "after" app validates once through the precompiled
+``UserResponseList`` adapter and returns a ``ModelResponse`` rendered by orjson.
+No database is involved: both serve the same in-memory ORM rows.
+
+    python -m benchmarks.serialization --requests 2000 --rows 100
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from app.models.user import User
+from app.schemas.user import UserBase, UserResponse, UserResponseList
+from app.utils.helpers import format_datetime
+from app.utils.responses import ModelResponse
+
+
+class LegacyUserResponse(UserBase):
+    """UserResponse as it was: input validators inherited, json_encoders config"""
+    id: int
+    is_superuser: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+        json_encoders = {datetime: format_datetime}
+
+
+def make_users(count: int) -> List[User]:
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=i, email=f"user{i}@example.com", username=f"user{i}", hashed_password="x",
+            is_active=True, is_superuser=False, created_at=now, updated_at=now,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy_app(users: List[User]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/users/", response_model=List[LegacyUserResponse])
+    async def read_users():
+        return [LegacyUserResponse.model_validate(user) for user in users]
+
+    @app.get("/users/me", response_model=LegacyUserResponse)
+    async def read_current_user():
+        return users[0]
+
+    return app
+
+
+def fast_app(users: List[User]) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+
+    @app.get("/users/", response_model=List[UserResponse])
+    async def read_users():
+        validated = UserResponseList.validate_python(users, from_attributes=True)
+        return ModelResponse(validated, adapter=UserResponseList)
+
+    @app.get("/users/me", response_model=UserResponse)
+    async def read_current_user():
+        return ModelResponse(UserResponse.model_validate(users[0]))
+
+    return app
+
+
+async def cpu_per_request(app: FastAPI, path: str, requests: int) -> float:
+    """Process CPU microseconds per sequential request"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(20):
+            await client.get(path)
+        start = time.process_time()
+        for _ in range(requests):
+            response = await client.get(path)
+            assert response.status_code == 200
+        return (time.process_time() - start) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=100)
+    args = parser.parse_args()
+
+    users = make_users(args.rows)
+    apps = {"response_model": legacy_app(users), "fast_path": fast_app(users)}
+    print(f"{'endpoint':<12}{'response_model':>18}{'fast_path':>14}{'saved':>14}")
+    for path in ("/users/", "/users/me"):
+        before, after = (
+            asyncio.run(cpu_per_request(app, path, args.requests)) for app in apps.values()
+        )
+        print(f"{path:<12}{before:>15.1f} us{after:>11.1f} us{before - after:>11.1f} us")
+
+
+if __name__ == "__main__":
+    main()
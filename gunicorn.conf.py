@@ -0,0 +1,88 @@
+"""Gunicorn settings for production: gunicorn -c gunicorn.conf.py app.main:app"""
+import os
+import shutil
+import time
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Peers trusted to set X-Forwarded-For/-Proto. The login lockouts and the
+# rate limiter key on the client address, so behind a proxy (nginx in
+# docker-compose.prod.yml) every client would otherwise share the proxy's
+# address and lock each other out. "*" is only safe when the app port is
+# reachable through the proxy alone and the proxy overwrites the header
+# (proxy_set_header X-Forwarded-For $remote_addr), since uvicorn then takes
+# its first entry.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Import the app once in the master and fork workers from it: the imported
+# code and data are shared copy-on-write and workers boot faster.
+# app.main opens no connections at import; post_fork drops any that exist.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# The shared memory rate limiter's segment is named after this master, so two
+# deployments on one host (or an old and a new master during a USR2 upgrade)
+# never share counts; on_exit removes it. Set before the app reads settings.
+os.environ.setdefault("RATE_LIMIT_SHM_NAME", f"fastapi-rate-limit-{os.getpid()}")
+
+# Every worker writes its metric samples here; /metrics aggregates them.
+# Must be set before prometheus_client is imported by a worker.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+# With preload_app the master imports prometheus_client before on_starting runs
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def verify_schema(server):
+    """Check the Alembic revision once here instead of in every worker.
+
+    Raising stops the master before any worker is forked. The verified
+    revision is passed to the workers through the environment, and the head
+    revision loaded from the scripts here is inherited by them, so a worker
+    only compares the two.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+    from app.core.config import settings
+    from app.core.schema import SCHEMA_REVISION_ENV, check_revision
+
+    if settings.DB_SCHEMA_STARTUP != "check":
+        return
+    start = time.perf_counter()
+    engine = create_engine(settings.DATABASE_URL, poolclass=NullPool)
+    try:
+        with engine.connect() as conn:
+            os.environ[SCHEMA_REVISION_ENV] = check_revision(conn)
+    finally:
+        engine.dispose()
+    server.log.info(
+        "Database schema at %s (checked in %.1f ms)",
+        os.environ[SCHEMA_REVISION_ENV], (time.perf_counter() - start) * 1000,
+    )
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be summed into the new ones
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    verify_schema(server)
+
+
+def post_fork(server, worker):
+    from app.core.database import dispose_inherited_pools
+
+    dispose_inherited_pools()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    from app.core.config import settings
+
+    if settings.RATE_LIMIT_BACKEND == "shared_memory":
+        from app.core.rate_limit import remove_shared_memory
+
+        remove_shared_memory()
@@ -6,7 +6,7 @@ from getpass import getpass
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core import database
 from app.models.user import User
 from app.core.security import get_password_hash
 from app.utils.helpers import is_valid_email, is_strong_password, sanitize_string
@@ -39,7 +39,8 @@ def create_superuser():
     # Sanitize username
     username = sanitize_string(username)
     
-    db: Session = SessionLocal()
+    database.init_engines()
+    db: Session = database.SessionLocal()
     
     try:
         # Check if user exists
@@ -6,17 +6,18 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal, engine
+from app.core import database
 from app.models.user import Base
 from app.core.security import get_password_hash
 from app.utils.helpers import sanitize_string
 
 def init_db():
     """Create tables and add initial data"""
+    database.init_engines()
     # Create all tables
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=database.engine)
     
-    db: Session = SessionLocal()
+    db: Session = database.SessionLocal()
     
     try:
         from app.models.user import User
@@ -7,8 +7,6 @@ export $(cat .env | xargs)
 
 # Run with gunicorn
 gunicorn app.main:app \
-    --workers 4 \
-    --worker-class uvicorn.workers.UvicornWorker \
-    --bind 0.0.0.0:8000 \
+    -c gunicorn.conf.py \
     --access-logfile logs/access.log \
     --error-logfile logs/error.log
\ No newline at end of file
@@ -1,3 +1,10 @@
+import os
+
+# The whole session shares one client IP; keep the app's limiter out of the way
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", str(10**9))
+# The test app is a single process, so the in-process user cache is coherent
+os.environ.setdefault("USER_CACHE_LOCAL", "true")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -5,9 +12,14 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.core.database import get_db
+from contextlib import asynccontextmanager
+from app.core.database import get_db, get_session_scope, SyncSessionAdapter
 from app.models.user import Base
 from app.core.security import get_password_hash
+from app.core.principal_cache import principal_cache
+from app.core.user_cache import user_cache
+from app.core.login_guard import login_guard
+from app.core.token_revocation import token_revocations
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -22,6 +34,7 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 @pytest.fixture(scope="function")
 def db():
     Base.metadata.create_all(bind=engine)
+    user_cache.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -30,14 +43,27 @@ def db():
         Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client(db):
-    def override_get_db():
+def session(db):
+    """The test session behind the async repository interface"""
+    return SyncSessionAdapter(db)
+
+@pytest.fixture(scope="function")
+def client(session):
+    async def override_get_db():
         try:
-            yield db
+            yield session
         finally:
             pass
     
+    @asynccontextmanager
+    async def test_session_scope():
+        yield session
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_scope] = lambda: test_session_scope
+    principal_cache.clear()
+    token_revocations.clear()
+    login_guard.clear()
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
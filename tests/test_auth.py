@@ -1,3 +1,10 @@
+import pytest
+from app.core.config import settings
+from app.core.principal_cache import principal_cache
+from app.core.security import decode_access_claims
+from app.core.token_revocation import TokenRevocations
+from app.repositories.user_repo import UserRepository
+
 def test_login_success(client, test_user):
     response = client.post(
         "/api/v1/auth/login",
@@ -33,3 +40,148 @@ def test_login_inactive_user(client, db, test_user):
     )
     assert response.status_code == 400
     assert response.json()["detail"] == "Inactive user"
+
+def test_login_rejected_when_hasher_saturated(client, test_user, monkeypatch):
+    from app.core import security
+    from app.utils.executor import BoundedExecutor
+    
+    monkeypatch.setattr(security, "password_hasher", BoundedExecutor(max_workers=1, max_queue=0))
+    security.password_hasher._in_flight = 1
+    
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "testuser", "password": "TestPassword123"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+@pytest.fixture
+def claims_mode(monkeypatch):
+    monkeypatch.setattr(settings, "JWT_CLAIMS_MODE", True)
+
+def login(client, username="testuser", password="TestPassword123"):
+    response = client.post("/api/v1/auth/login", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_claims_token_authorizes_without_user_lookup(client, claims_mode, test_superuser, monkeypatch):
+    headers = login(client, "admin", "AdminPassword123")
+    claims = decode_access_claims(headers["Authorization"].split()[1])
+    assert claims["uid"] == test_superuser.id
+    assert claims["is_superuser"] is True
+    assert claims["token_version"] == 0
+    
+    async def no_lookup(self, username):
+        raise AssertionError("user row loaded")
+    monkeypatch.setattr(UserRepository, "get_by_username", no_lookup)
+    assert client.get("/api/v1/users/page", headers=headers).status_code == 200
+
+def test_deactivation_revokes_claims_token(client, claims_mode, test_user, test_superuser):
+    user_id = test_user.id
+    user_headers = login(client)
+    admin_headers = login(client, "admin", "AdminPassword123")
+    assert client.get(f"/api/v1/users/{user_id}", headers=user_headers).status_code == 200
+    
+    client.put(f"/api/v1/users/{user_id}", headers=admin_headers, json={"is_active": False})
+    response = client.get(f"/api/v1/users/{user_id}", headers=user_headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+
+def test_email_change_keeps_claims_token(client, claims_mode, test_user, test_superuser):
+    user_id = test_user.id
+    user_headers = login(client)
+    admin_headers = login(client, "admin", "AdminPassword123")
+    client.put(f"/api/v1/users/{user_id}", headers=admin_headers, json={"email": "changed@example.com"})
+    assert client.get(f"/api/v1/users/{user_id}", headers=user_headers).status_code == 200
+
+def test_me_rejects_token_with_old_version(client, claims_mode, db, test_user):
+    headers = login(client)
+    test_user.token_version = 1
+    db.commit()
+    principal_cache.clear()
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 401
+
+def test_token_without_claims_falls_back_to_lookup(client, test_user, monkeypatch):
+    headers = login(client)
+    monkeypatch.setattr(settings, "JWT_CLAIMS_MODE", True)
+    response = client.get(f"/api/v1/users/{test_user.id}", headers=headers)
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_refresh_sees_changes_from_other_workers(session, db, test_user, test_superuser):
+    revocations = TokenRevocations(lifetime_seconds=1800)
+    test_user.token_version = 2
+    db.commit()
+    
+    await revocations.refresh(session)
+    assert revocations.is_revoked(test_user.id, 1)
+    assert not revocations.is_revoked(test_user.id, 2)
+    assert not revocations.is_revoked(test_superuser.id, 0)
+
+@pytest.mark.asyncio
+async def test_refresh_revokes_deleted_users(session, db, test_user):
+    revocations = TokenRevocations(lifetime_seconds=1800)
+    user_id = test_user.id
+    assert not revocations.is_revoked(user_id, 0)
+    
+    db.delete(test_user)
+    db.commit()
+    await revocations.refresh(session)
+    assert revocations.is_revoked(user_id, 0)
+
+def test_login_locked_out_before_user_lookup(client, test_user, monkeypatch):
+    from app.core.login_guard import login_guard
+    
+    monkeypatch.setattr(login_guard, "thresholds", {"username": 2, "ip": 100})
+    for _ in range(2):
+        response = client.post("/api/v1/auth/login", data={"username": "testuser", "password": "wrong"})
+        assert response.status_code == 401
+    
+    async def no_lookup(self, username):
+        raise AssertionError("locked out logins must not query the database")
+    
+    monkeypatch.setattr(UserRepository, "get_by_username", no_lookup)
+    response = client.post("/api/v1/auth/login", data={"username": "testuser", "password": "TestPassword123"})
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Too many failed login attempts"
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_successful_login_resets_username_failures(client, test_user, monkeypatch):
+    from app.core.login_guard import login_guard
+    
+    monkeypatch.setattr(login_guard, "thresholds", {"username": 2, "ip": 100})
+    client.post("/api/v1/auth/login", data={"username": "testuser", "password": "wrong"})
+    assert client.post(
+        "/api/v1/auth/login", data={"username": "testuser", "password": "TestPassword123"}
+    ).status_code == 200
+    assert client.post(
+        "/api/v1/auth/login", data={"username": "testuser", "password": "wrong"}
+    ).status_code == 401
+
+def test_login_unknown_user_runs_dummy_verify(client):
+    from app.core.login_guard import login_guard
+    
+    response = client.post("/api/v1/auth/login", data={"username": "nobody", "password": "TestPassword123"})
+    assert response.status_code == 401
+    assert login_guard.stats["dummy_verifies"] >= 1
+
+def test_login_guard_keys_on_forwarded_client(client, monkeypatch):
+    from fastapi.testclient import TestClient
+    from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+    from app.core.login_guard import login_guard
+    
+    # What UvicornWorker installs from gunicorn's forwarded_allow_ips; the test
+    # client sends no peer address, so trust every peer
+    proxied = TestClient(ProxyHeadersMiddleware(client.app, trusted_hosts="*"))
+    failures = []
+    
+    async def record_failure(username, ip):
+        failures.append(ip)
+    
+    monkeypatch.setattr(login_guard, "record_failure", record_failure)
+    response = proxied.post(
+        "/api/v1/auth/login",
+        data={"username": "nobody", "password": "wrong"},
+        headers={"X-Forwarded-For": "203.0.113.7"},
+    )
+    assert response.status_code == 401
+    assert failures == ["203.0.113.7"]
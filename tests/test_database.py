@@ -0,0 +1,122 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import QueuePool
+from app.core.config import settings
+from app.core import database
+from app.core.database import configure_engine, enable_idle_ping, engine_options, get_async_database_url
+from app.models.user import Base
+from app.repositories.user_repo import UserRepository
+from app.schemas.user import UserCreate, UserUpdate
+
+def test_async_url_for_postgres():
+    url = get_async_database_url("postgresql://postgres:secret@db:5432/appdb")
+    assert url == "postgresql+asyncpg://postgres:secret@db:5432/appdb"
+
+def test_async_url_for_sqlite():
+    assert get_async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+
+def test_async_url_unknown_backend():
+    with pytest.raises(ValueError):
+        get_async_database_url("mysql://root@localhost/appdb")
+
+def test_pool_options_for_postgres():
+    options = engine_options("postgresql://postgres:secret@db:5432/appdb")
+    assert issubclass(options["poolclass"], QueuePool)
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert options["pool_timeout"] == settings.DB_POOL_TIMEOUT
+    assert options["pool_recycle"] == settings.DB_POOL_RECYCLE
+
+def test_pool_options_for_asyncpg():
+    options = engine_options("postgresql+asyncpg://postgres:secret@db:5432/appdb")
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+
+def test_pool_options_skip_sizing_for_sqlite_memory():
+    options = engine_options("sqlite://")
+    assert "pool_size" not in options
+    create_engine("sqlite://", **options).dispose()
+
+def pool_sample(name, **labels):
+    return REGISTRY.get_sample_value(name, {"pool": "idle-test", **labels}) or 0.0
+
+def test_idle_ping_replaces_dead_connections(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_PRE_PING", False)
+    monkeypatch.setattr(settings, "DB_POOL_PING_IDLE_SECONDS", 0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'ping.db'}", poolclass=QueuePool, pool_size=1)
+    configure_engine(engine, label="idle-test")
+    created = pool_sample("db_pool_connections_created_total")
+    invalidated = pool_sample("db_pool_invalidations_total")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert pool_sample("db_pool_pings_total", result="ok") == 1
+    assert pool_sample("db_pool_connections_created_total") == created + 1
+
+    # Simulate the server dropping the idle connection
+    engine.pool._pool.queue[0].dbapi_connection.close()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    assert pool_sample("db_pool_pings_total", result="failed") == 1
+    assert pool_sample("db_pool_invalidations_total") == invalidated + 1
+    assert pool_sample("db_pool_connections_created_total") == created + 2
+    # The failed checkout was never counted, so the gauge is back to zero
+    assert pool_sample("db_pool_checked_out") == 0
+    engine.dispose()
+
+def test_recently_used_connections_are_not_pinged(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ping.db'}", poolclass=QueuePool, pool_size=1)
+    enable_idle_ping(engine, idle_seconds=3600, label="busy-test")
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    assert REGISTRY.get_sample_value("db_pool_pings_total", {"pool": "busy-test", "result": "ok"}) is None
+    engine.dispose()
+
+@pytest.mark.asyncio
+async def test_repository_on_async_session():
+    """The repository runs unchanged on a native AsyncSession"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    AsyncTestingSession = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    try:
+        async with AsyncTestingSession() as session:
+            repo = UserRepository(session)
+            user = await repo.create(UserCreate(
+                email="async@example.com",
+                username="asyncuser",
+                password="AsyncPassword123",
+            ))
+            assert user.id is not None
+
+            updated = await repo.update(user.id, UserUpdate(username="renamed"))
+            assert updated.username == "renamed"
+            assert (await repo.get_by_username("renamed")).id == user.id
+            assert len(await repo.get_multi()) == 1
+
+            batches = [batch async for batch in repo.stream_columns(["id", "username"], batch_size=1)]
+            assert [list(batch[0]) for batch in batches] == [[user.id, "renamed"]]
+
+            assert await repo.delete(updated.id) is True
+            assert await repo.get_by_id(user.id) is None
+    finally:
+        await engine.dispose()
+
+def test_engines_created_on_demand_and_disposed_after_fork(monkeypatch):
+    for name in ("engine", "SessionLocal", "async_engine", "AsyncSessionLocal", "replica_set"):
+        monkeypatch.setattr(database, name, None)
+    database.init_engines()
+    engine = database.engine
+    database.init_engines()
+    assert database.engine is engine
+    
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    pool = engine.pool
+    database.dispose_inherited_pools()
+    assert engine.pool is not pool
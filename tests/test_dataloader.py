@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from app.repositories.user_repo import UserRepository
+from app.utils.dataloader import DataLoader
+
+def recording_loader(batches, **kwargs):
+    async def batch_fn(keys):
+        batches.append(list(keys))
+        await asyncio.sleep(0)
+        return {key: key * 10 for key in keys if key > 0}
+    return DataLoader(batch_fn, **kwargs)
+
+@pytest.mark.asyncio
+async def test_loads_in_one_tick_are_batched():
+    batches = []
+    loader = recording_loader(batches)
+    results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(-1))
+    assert results == [10, 20, 10, None]
+    assert batches == [[1, 2, -1]]
+    assert loader.stats == {"loads": 4, "batches": 1}
+
+@pytest.mark.asyncio
+async def test_later_loads_get_a_new_batch():
+    batches = []
+    loader = recording_loader(batches)
+    assert await loader.load(1) == 10
+    assert await loader.load(2) == 20
+    assert batches == [[1], [2]]
+
+@pytest.mark.asyncio
+async def test_batches_split_at_max_size():
+    batches = []
+    loader = recording_loader(batches, max_batch_size=2)
+    assert await loader.load_many([1, 2, 3]) == [10, 20, 30]
+    assert batches == [[1, 2], [3]]
+
+@pytest.mark.asyncio
+async def test_batch_error_reaches_every_caller():
+    async def batch_fn(keys):
+        raise RuntimeError("database down")
+    loader = DataLoader(batch_fn)
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+@pytest.mark.asyncio
+async def test_concurrent_get_by_id_is_one_query(session, test_user, test_superuser):
+    statements = []
+    execute = session.sync_session.execute
+    
+    def counting_execute(*args, **kwargs):
+        statements.append(args[0])
+        return execute(*args, **kwargs)
+    session.sync_session.execute = counting_execute
+    
+    first, second, missing = await asyncio.gather(
+        UserRepository(session).get_by_id(test_user.id),
+        UserRepository(session).get_by_id(test_superuser.id),
+        UserRepository(session).get_by_id(999),
+    )
+    assert (first.username, second.username, missing) == ("testuser", "admin", None)
+    assert len(statements) == 1
@@ -6,7 +6,8 @@ from app.utils.exceptions import (
     BadRequestException,
     UnauthorizedException,
     ForbiddenException,
-    ConflictException
+    ConflictException,
+    ServiceUnavailableException
 )
 
 
@@ -92,6 +93,23 @@ class TestConflictException:
         assert exc.detail == "Email already exists"
 
 
+class TestServiceUnavailableException:
+    """Test ServiceUnavailableException custom exception"""
+    
+    def test_default_message(self):
+        """Test exception with default message"""
+        exc = ServiceUnavailableException()
+        assert exc.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert exc.detail == "Service unavailable"
+        assert exc.headers == {"Retry-After": "1"}
+    
+    def test_custom_retry_after(self):
+        """Test exception with custom message and retry hint"""
+        exc = ServiceUnavailableException("Server is busy", retry_after=5)
+        assert exc.detail == "Server is busy"
+        assert exc.headers == {"Retry-After": "5"}
+
+
 class TestExceptionRaising:
     """Test that exceptions can be raised and caught properly"""
     
@@ -0,0 +1,97 @@
+"""Tests for the bounded executor used for password hashing"""
+import asyncio
+import threading
+import pytest
+from app.core import security
+from app.utils.executor import BoundedExecutor, ExecutorSaturated
+
+
+@pytest.mark.asyncio
+class TestBoundedExecutor:
+    """Test BoundedExecutor queueing and backpressure"""
+    
+    async def test_runs_callable(self):
+        executor = BoundedExecutor(max_workers=2, max_queue=2)
+        try:
+            assert await executor.run(pow, 2, 10) == 1024
+            assert executor.stats["completed"] == 1
+            assert executor.in_flight == 0
+        finally:
+            executor.shutdown()
+    
+    async def test_rejects_when_queue_full(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(executor.run(release.wait))
+            queued = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.05)
+            assert executor.queue_depth == 1
+            
+            with pytest.raises(ExecutorSaturated):
+                await executor.run(release.wait)
+            assert executor.stats["rejected"] == 1
+            
+            release.set()
+            await asyncio.gather(running, queued)
+            # The queued call waited for the first one to finish
+            assert executor.stats["wait_seconds_max"] >= 0.04
+        finally:
+            release.set()
+            executor.shutdown()
+    
+    async def test_wait_for_capacity_queues_in_order(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0, wait_for_capacity=True)
+        release = threading.Event()
+        try:
+            first = asyncio.ensure_future(executor.map(lambda _: release.wait(), [1]))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(executor.map(abs, [-1, -2]))
+            await asyncio.sleep(0.01)
+            assert not second.done()
+            assert executor.stats["rejected"] == 0
+            release.set()
+            assert await first == [True]
+            assert await second == [1, 2]
+            assert executor.in_flight == 0
+        finally:
+            release.set()
+            executor.shutdown()
+    
+    async def test_cancelled_waiter_frees_its_place(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0, wait_for_capacity=True)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.01)
+            waiting = asyncio.ensure_future(executor.run(abs, -1))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            release.set()
+            await running
+            assert await executor.run(abs, -3) == 3
+            assert executor.in_flight == 0
+        finally:
+            release.set()
+            executor.shutdown()
+    
+    async def test_process_pool(self):
+        executor = BoundedExecutor(kind="process", max_workers=1)
+        try:
+            hashed = await executor.run(security.get_password_hash, "Password123")
+            assert security.verify_password("Password123", hashed)
+        finally:
+            executor.shutdown()
+    
+    async def test_map_preserves_order(self):
+        executor = BoundedExecutor(max_workers=3, max_queue=0)
+        try:
+            assert await executor.map(abs, list(range(-10, 0))) == list(range(10, 0, -1))
+            assert executor.stats["completed"] == 3
+        finally:
+            executor.shutdown()
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        BoundedExecutor(kind="fiber")
@@ -1,12 +1,15 @@
 """Tests for utility helper functions"""
 import pytest
-from datetime import datetime
+from datetime import datetime, timezone
+from app.utils.etag import etag_in, make_etag, parse_etag
 from app.utils.helpers import (
     is_valid_email,
     is_strong_password,
     sanitize_string,
     format_datetime,
-    parse_datetime
+    parse_datetime,
+    encode_cursor,
+    decode_cursor
 )
 
 
@@ -103,3 +106,62 @@ class TestDateTimeFormatting:
         assert parsed.year == original.year
         assert parsed.month == original.month
         assert parsed.day == original.day
+
+
+
+class TestCursorEncoding:
+    """Test opaque pagination cursor helpers"""
+    
+    def test_cursor_roundtrip(self):
+        """Test encoding and decoding pagination state"""
+        cursor = encode_cursor({"id": 42})
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == {"id": 42}
+    
+    def test_decode_invalid_cursor(self):
+        """Test malformed cursors decode to None"""
+        assert decode_cursor("not-a-cursor") is None
+        assert decode_cursor(encode_cursor({"id": 1})[:-2]) is None
+        assert decode_cursor("WzFd") is None  # a JSON list, not an object
+
+
+
+class TestETags:
+    """Test ETag helpers"""
+    
+    def test_etag_roundtrip(self):
+        """Test the id and exact timestamp can be recovered"""
+        updated_at = datetime(2026, 1, 30, 12, 30, 45, 123456)
+        etag = make_etag(7, updated_at)
+        assert etag.startswith('"') and etag.endswith('"')
+        assert parse_etag(etag) == (7, updated_at)
+    
+    def test_aware_timestamps_match_naive_utc(self):
+        """Test aware and naive UTC values give the same ETag"""
+        naive = datetime(2026, 1, 30, 12, 30, 45)
+        assert make_etag(1, naive) == make_etag(1, naive.replace(tzinfo=timezone.utc))
+    
+    def test_parse_invalid_etag(self):
+        """Test malformed ETags parse to None"""
+        assert parse_etag("7-abc") is None
+        assert parse_etag('"seven-abc"') is None
+        assert parse_etag('""') is None
+        assert parse_etag('"7--1"') is None
+        assert parse_etag('"7-0xff"') is None
+        assert parse_etag('"7-f_f"') is None
+        assert parse_etag('"7- ff"') is None
+        assert parse_etag('"7-FF"') is None
+        assert parse_etag('"1-ffffffffffffffffffff"') is None
+    
+    def test_zero_timestamp_still_parses_to_a_datetime(self):
+        """Test an ETag with 0 microseconds keeps its precondition"""
+        assert parse_etag('"7-0"') == (7, datetime(1970, 1, 1))
+    
+    def test_etag_in_header(self):
+        """Test If-None-Match / If-Match list matching"""
+        etag = make_etag(1, datetime(2026, 1, 30))
+        assert etag_in(f'"other", {etag}', etag)
+        assert etag_in("*", etag)
+        assert etag_in(f"W/{etag}", etag)
+        assert not etag_in(f"W/{etag}", etag, weak=False)
+        assert not etag_in(None, etag)
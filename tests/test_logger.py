@@ -0,0 +1,108 @@
+"""Tests for the queued logging pipeline and access log middleware"""
+import json
+import logging
+import os
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.middleware.access_log import AccessLogger
+from app.utils.logger import JsonFormatter, LazyQueueHandler, setup_logger, shutdown_logging
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def make_client(sample_rate):
+    logger = logging.getLogger(f"test.access.{sample_rate}")
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    logger.handlers = [handler]
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {}
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            yield b"a"
+            yield b"b"
+        return StreamingResponse(body())
+
+    @app.get("/missing")
+    async def missing():
+        return JSONResponse({}, status_code=404)
+
+    app.add_middleware(AccessLogger, logger=logger, sample_rate=sample_rate)
+    return TestClient(app), handler.records
+
+def test_setup_logger_is_idempotent(tmp_path):
+    log_file = str(tmp_path / "app.log")
+    logger = setup_logger("test.idempotent", log_file)
+    assert setup_logger("test.idempotent", log_file) is logger
+    assert sum(isinstance(h, LazyQueueHandler) for h in logger.handlers) == 1
+
+def test_forked_child_keeps_logging(tmp_path):
+    log_file = tmp_path / "fork.log"
+    logger = setup_logger("test.fork", str(log_file))
+    pid = os.fork()
+    if pid == 0:
+        # Child: the listener thread must have been restarted by the fork hook
+        try:
+            logger.warning("from child")
+            shutdown_logging()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    assert "from child" in log_file.read_text()
+
+def test_forked_child_gets_its_own_queue(tmp_path):
+    logger = setup_logger("test.fork.queue", str(tmp_path / "fork.log"))
+    handler = next(h for h in logger.handlers if isinstance(h, LazyQueueHandler))
+    parent_queue = handler.queue
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if handler.queue is not parent_queue else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert handler.queue is parent_queue
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.makeLogRecord({
+        "name": "app.access", "levelname": "INFO", "msg": "%s %s", "args": ("GET", "/"),
+        "duration_ms": 1.5,
+    })
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "GET /"
+    assert entry["duration_ms"] == 1.5
+    assert entry["logger"] == "app.access"
+
+def test_queue_handler_defers_formatting():
+    record = logging.makeLogRecord({"msg": "%s", "args": ("deferred",)})
+    prepared = LazyQueueHandler(None).prepare(record)
+    assert prepared.args == ("deferred",)
+
+def test_one_access_record_per_request():
+    client, records = make_client(1.0)
+    assert client.get("/ok").status_code == 200
+    assert len(records) == 1
+    assert records[0].getMessage() == "GET /ok 200"
+    assert records[0].status == 200
+    assert records[0].duration_ms >= 0
+
+def test_sampling_drops_success_but_keeps_errors():
+    client, records = make_client(0.0)
+    client.get("/ok")
+    client.get("/missing")
+    assert [record.status for record in records] == [404]
+
+def test_streaming_response_passes_through():
+    client, records = make_client(1.0)
+    response = client.get("/stream")
+    assert response.content == b"ab"
+    assert [record.status for record in records] == [200]
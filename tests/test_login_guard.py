@@ -0,0 +1,85 @@
+"""Tests for the login lockouts and the dummy verify budget"""
+import pytest
+from app.core import security
+from app.core.login_guard import LoginGuard, lockout_seconds
+from app.core.redis import FakeRedis
+
+def test_lockout_grows_exponentially_up_to_the_cap():
+    assert [lockout_seconds(n, 3, 1.0, 10.0) for n in range(1, 8)] == [0, 0, 1, 2, 4, 8, 10]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("redis", [None, FakeRedis()], ids=["memory", "redis"])
+async def test_username_locked_after_threshold(redis):
+    guard = LoginGuard(redis=redis, username_threshold=2, ip_threshold=100, base_lockout=30)
+    await guard.record_failure("alice", "10.0.0.1")
+    assert await guard.retry_after("alice", "10.0.0.1") == 0
+    
+    await guard.record_failure("alice", "10.0.0.1")
+    assert 29 < await guard.retry_after("alice", "10.0.0.2") <= 30
+    assert await guard.retry_after("bob", "10.0.0.1") == 0
+    
+    await guard.record_success("alice")
+    assert await guard.retry_after("alice", "10.0.0.1") == 0
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("redis", [None, FakeRedis()], ids=["memory", "redis"])
+async def test_ip_locked_across_usernames(redis):
+    guard = LoginGuard(redis=redis, username_threshold=100, ip_threshold=3)
+    for i in range(3):
+        await guard.record_failure(f"user{i}", "10.0.0.1")
+    assert await guard.retry_after("someone-else", "10.0.0.1") > 0
+    assert await guard.retry_after("someone-else", "10.0.0.2") == 0
+    # A success only clears the username
+    await guard.record_success("someone-else")
+    assert await guard.retry_after("someone-else", "10.0.0.1") > 0
+
+@pytest.mark.asyncio
+async def test_disabled_guard_never_locks():
+    guard = LoginGuard(username_threshold=1, enabled=False)
+    await guard.record_failure("alice", "10.0.0.1")
+    assert await guard.retry_after("alice", "10.0.0.1") == 0
+
+@pytest.mark.asyncio
+async def test_dummy_verify_sleeps_past_its_budget(monkeypatch):
+    verified = []
+    
+    async def fake_hash(password):
+        return "dummy-hash"
+    
+    async def fake_verify(password, hashed_password):
+        verified.append(hashed_password)
+        return False
+    
+    monkeypatch.setattr(security, "get_password_hash_async", fake_hash)
+    monkeypatch.setattr(security, "verify_password_async", fake_verify)
+    monkeypatch.setattr(security, "verify_seconds", 0.001)
+    guard = LoginGuard(dummy_verify_per_second=2)
+    
+    for _ in range(5):
+        await guard.dummy_verify("guess")
+    assert verified == ["dummy-hash", "dummy-hash"]
+    assert guard.stats["dummy_sleeps"] == 3
+
+@pytest.mark.asyncio
+async def test_dummy_verify_before_any_timing_hashes(monkeypatch):
+    verified = []
+    
+    async def fake_hash(password):
+        return "dummy-hash"
+    
+    async def fake_verify(password, hashed_password):
+        verified.append(hashed_password)
+        return False
+    
+    monkeypatch.setattr(security, "get_password_hash_async", fake_hash)
+    monkeypatch.setattr(security, "verify_password_async", fake_verify)
+    monkeypatch.setattr(security, "verify_seconds", 0.0)
+    guard = LoginGuard(dummy_verify_per_second=1)
+    
+    await guard.dummy_verify("guess")
+    # Over budget, but a sleep of 0 would give the unknown user away
+    await guard.dummy_verify("guess")
+    assert verified == ["dummy-hash", "dummy-hash"]
+
+def test_startup_times_a_verify(client):
+    assert security.verify_seconds > 0
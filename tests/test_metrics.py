@@ -0,0 +1,65 @@
+"""Tests for the Prometheus metrics endpoint and instrumentation"""
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from app.core.metrics import instrument_engine, instrumented_pool_class
+from app.core.security import create_access_token, decode_access_token, verify_password_async, get_password_hash
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_metrics_endpoint(client):
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    assert "db_pool_checkout_wait_seconds" in response.text
+
+def test_request_labelled_by_route_template(client, user_token, test_user):
+    labels = {"method": "GET", "route": "/api/v1/users/{user_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    client.get(f"/api/v1/users/{test_user.id}", headers={"Authorization": f"Bearer {user_token}"})
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+
+def test_unmatched_routes_share_one_label(client):
+    labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    client.get("/no/such/path/1")
+    client.get("/no/such/path/2")
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+
+def test_rejected_request_keeps_route_template(client):
+    # Routed, then rejected by a dependency: still labelled by its template
+    labels = {"method": "GET", "route": "/api/v1/users/{user_id}", "status": "401"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    client.get("/api/v1/users/1")
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+    assert sample("http_requests_in_progress", method="GET") == 0
+
+def test_pool_checkout_is_instrumented():
+    engine = create_engine(
+        "sqlite://", poolclass=instrumented_pool_class(QueuePool, label="test"), pool_size=1
+    )
+    instrument_engine(engine, label="test")
+    before = sample("db_pool_checkout_wait_seconds_count", pool="test")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert sample("db_pool_checked_out", pool="test") == 1
+    assert sample("db_pool_checked_out", pool="test") == 0
+    assert sample("db_pool_checkout_wait_seconds_count", pool="test") == before + 1
+    assert sample("db_pool_size", pool="test") == 1
+
+def test_jwt_decode_is_timed():
+    before = sample("jwt_decode_duration_seconds_count")
+    assert decode_access_token(create_access_token({"sub": "someone"})) == "someone"
+    assert sample("jwt_decode_duration_seconds_count") == before + 1
+
+@pytest.mark.asyncio
+async def test_password_verify_is_timed():
+    hashed = get_password_hash("secret")
+    before = sample("password_hash_duration_seconds_count", operation="verify")
+    assert await verify_password_async("secret", hashed) is True
+    assert sample("password_hash_duration_seconds_count", operation="verify") == before + 1
@@ -0,0 +1,74 @@
+import pytest
+from app.core.principal_cache import PrincipalCache, principal_cache
+from app.core.redis import FakeRedis
+from app.repositories.user_repo import UserRepository
+from app.schemas.user import UserUpdate
+
+@pytest.mark.asyncio
+async def test_local_hit_returns_detached_copy(test_user):
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    assert await cache.get("testuser") is None
+    await cache.set(test_user)
+
+    cached = await cache.get("testuser")
+    assert cached is not test_user
+    assert cached.id == test_user.id
+    assert cached.is_active is True
+    assert cached.hashed_password is None
+    assert cache.stats == {"l1_hits": 1, "l2_hits": 0, "misses": 1, "invalidations": 0}
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_workers(test_user):
+    redis = FakeRedis()
+    worker_a = PrincipalCache(maxsize=10, ttl=60, redis=redis)
+    worker_b = PrincipalCache(maxsize=10, ttl=60, redis=redis)
+    await worker_a.set(test_user)
+
+    cached = await worker_b.get("testuser")
+    assert cached.id == test_user.id
+    assert cached.created_at == test_user.created_at
+    assert worker_b.stats["l2_hits"] == 1
+
+    await worker_a.invalidate("testuser")
+    worker_b.clear()
+    assert await worker_b.get("testuser") is None
+
+@pytest.mark.asyncio
+async def test_repository_update_invalidates(session, test_user):
+    principal_cache.clear()
+    await principal_cache.set(test_user)
+    await UserRepository(session).update(test_user.id, UserUpdate(username="renamed"))
+    assert await principal_cache.get("testuser") is None
+    assert await principal_cache.get("renamed") is None
+
+@pytest.mark.asyncio
+async def test_repository_delete_invalidates(session, test_user):
+    principal_cache.clear()
+    await principal_cache.set(test_user)
+    await UserRepository(session).delete(test_user.id)
+    assert await principal_cache.get("testuser") is None
+
+def test_current_user_served_from_cache(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    misses = principal_cache.stats["misses"]
+    hits = principal_cache.stats["l1_hits"]
+
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+    assert principal_cache.stats["misses"] == misses + 1
+    assert principal_cache.stats["l1_hits"] == hits + 1
+
+def test_deactivation_takes_effect_immediately(client, user_token, superuser_token, test_user):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        json={"is_active": False}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
@@ -0,0 +1,213 @@
+"""Tests for the rate limiting algorithms, backends and middleware"""
+import asyncio
+import os
+import uuid
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.rate_limit import (
+    TokenBucket,
+    SlidingWindowCounter,
+    MemoryBackend,
+    SharedMemoryBackend,
+    RedisBackend,
+    remove_shared_memory,
+)
+from app.core.redis import FakeRedis
+from app.middleware.rate_limiter import RateLimiter
+
+NOW = 1_800_000_000.0  # aligned to a 60 second window
+
+
+@pytest.mark.asyncio
+class TestTokenBucket:
+    """Test the token bucket algorithm"""
+    
+    async def test_allows_burst_then_rejects(self):
+        backend = MemoryBackend(TokenBucket(limit=3, window=60))
+        results = [await backend.hit("ip", now=NOW) for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[-1].retry_after == pytest.approx(20.0)
+    
+    async def test_refills_over_time(self):
+        backend = MemoryBackend(TokenBucket(limit=3, window=60))
+        for _ in range(3):
+            await backend.hit("ip", now=NOW)
+        assert not (await backend.hit("ip", now=NOW + 1)).allowed
+        assert (await backend.hit("ip", now=NOW + 20)).allowed
+
+
+@pytest.mark.asyncio
+class TestSlidingWindowCounter:
+    """Test the sliding window counter algorithm"""
+    
+    async def test_limit_within_window(self):
+        backend = MemoryBackend(SlidingWindowCounter(limit=2, window=60))
+        assert (await backend.hit("ip", now=NOW)).allowed
+        assert (await backend.hit("ip", now=NOW + 1)).allowed
+        result = await backend.hit("ip", now=NOW + 2)
+        assert not result.allowed
+        assert result.retry_after == pytest.approx(58.0)
+    
+    async def test_previous_window_is_weighted(self):
+        backend = MemoryBackend(SlidingWindowCounter(limit=2, window=60))
+        await backend.hit("ip", now=NOW + 50)
+        await backend.hit("ip", now=NOW + 55)
+        # 15s into the next window 75% of the previous two requests still count
+        assert not (await backend.hit("ip", now=NOW + 75)).allowed
+        # Half way through only one of them does
+        assert (await backend.hit("ip", now=NOW + 90)).allowed
+    
+    async def test_keys_are_independent(self):
+        backend = MemoryBackend(SlidingWindowCounter(limit=1, window=60))
+        assert (await backend.hit("a", now=NOW)).allowed
+        assert (await backend.hit("b", now=NOW)).allowed
+        assert not (await backend.hit("a", now=NOW)).allowed
+
+
+@pytest.mark.asyncio
+class TestMemoryBackend:
+    """Test memory bounds of the in-process backend"""
+    
+    async def test_idle_keys_are_evicted(self):
+        backend = MemoryBackend(SlidingWindowCounter(limit=1, window=60), max_keys=100)
+        for i in range(1000):
+            await backend.hit(f"10.0.{i // 256}.{i % 256}", now=NOW)
+        assert len(backend._states) == 100
+
+
+@pytest.mark.asyncio
+class TestSharedMemoryBackend:
+    """Test the cross-worker shared memory backend"""
+    
+    async def test_workers_share_counts(self):
+        name = f"test-rate-limit-{uuid.uuid4().hex[:8]}"
+        worker_a = SharedMemoryBackend(SlidingWindowCounter(limit=2, window=60), slots=64, name=name)
+        worker_b = SharedMemoryBackend(SlidingWindowCounter(limit=2, window=60), slots=64, name=name)
+        try:
+            assert (await worker_a.hit("ip", now=NOW)).allowed
+            assert (await worker_b.hit("ip", now=NOW)).allowed
+            assert not (await worker_a.hit("ip", now=NOW)).allowed
+            assert (await worker_b.hit("other", now=NOW)).allowed
+        finally:
+            worker_a._shm.close()
+            worker_b._shm.close()
+            worker_a._shm.unlink()
+    
+    async def test_lock_is_exclusive_across_fork(self):
+        import fcntl
+        
+        name = f"test-rate-limit-{uuid.uuid4().hex[:8]}"
+        # Built before the fork, like the app under a preloading gunicorn master
+        backend = SharedMemoryBackend(TokenBucket(limit=1, window=60), slots=16, name=name)
+        await backend.hit("ip", now=NOW)
+        fcntl.flock(backend._lock(), fcntl.LOCK_EX)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    fcntl.flock(backend._lock(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os._exit(1)
+                except BlockingIOError:
+                    os._exit(0)
+            _, status = os.waitpid(pid, 0)
+            assert os.WEXITSTATUS(status) == 0, "child acquired the lock held by its parent"
+        finally:
+            fcntl.flock(backend._lock(), fcntl.LOCK_UN)
+            backend._shm.close()
+            backend._shm.unlink()
+    
+    async def test_waiting_for_the_lock_does_not_block_the_loop(self):
+        import fcntl
+        
+        name = f"test-rate-limit-{uuid.uuid4().hex[:8]}"
+        backend = SharedMemoryBackend(TokenBucket(limit=1, window=60), slots=16, name=name)
+        # A separate open file description, as another worker would have
+        other_worker = os.open(backend._lock_path, os.O_CREAT | os.O_RDWR)
+        fcntl.flock(other_worker, fcntl.LOCK_EX)
+        try:
+            hit = asyncio.ensure_future(backend.hit("ip", now=NOW))
+            await asyncio.sleep(0.02)
+            assert not hit.done()
+            fcntl.flock(other_worker, fcntl.LOCK_UN)
+            assert (await asyncio.wait_for(hit, 1)).allowed
+        finally:
+            os.close(other_worker)
+            backend._shm.close()
+            backend._shm.unlink()
+    
+    async def test_remove_shared_memory(self):
+        from multiprocessing import shared_memory
+        
+        name = f"test-rate-limit-{uuid.uuid4().hex[:8]}"
+        backend = SharedMemoryBackend(TokenBucket(limit=1, window=60), slots=16, name=name)
+        await backend.hit("ip", now=NOW)
+        backend._shm.close()
+        remove_shared_memory(name)
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=SharedMemoryBackend.segment_name(name, TokenBucket.name))
+        assert not os.path.exists(backend._lock_path)
+        # Nothing left to remove is not an error
+        remove_shared_memory(name)
+    
+    async def test_table_size_is_fixed(self):
+        name = f"test-rate-limit-{uuid.uuid4().hex[:8]}"
+        backend = SharedMemoryBackend(TokenBucket(limit=1, window=60), slots=16, name=name)
+        try:
+            for i in range(200):
+                assert (await backend.hit(f"key-{i}", now=NOW)).allowed
+            # The most recent key still has its state after the table wrapped
+            assert not (await backend.hit("key-199", now=NOW)).allowed
+        finally:
+            backend._shm.close()
+            backend._shm.unlink()
+
+
+@pytest.mark.asyncio
+class TestRedisBackend:
+    """Test the Redis backend against the in-process fake"""
+    
+    @pytest.mark.parametrize("algorithm_cls", [TokenBucket, SlidingWindowCounter])
+    async def test_enforces_limit(self, algorithm_cls):
+        backend = RedisBackend(algorithm_cls(limit=2, window=60), FakeRedis())
+        results = [await backend.hit("ip", now=NOW) for _ in range(3)]
+        assert [r.allowed for r in results] == [True, True, False]
+        assert results[-1].retry_after > 0
+    
+    async def test_workers_share_counts(self):
+        redis = FakeRedis()
+        worker_a = RedisBackend(TokenBucket(limit=1, window=60), redis)
+        worker_b = RedisBackend(TokenBucket(limit=1, window=60), redis)
+        assert (await worker_a.hit("ip", now=NOW)).allowed
+        assert not (await worker_b.hit("ip", now=NOW)).allowed
+
+
+class TestRateLimiterMiddleware:
+    """Test the HTTP middleware"""
+    
+    @staticmethod
+    def make_client(backend):
+        app = FastAPI()
+        app.add_middleware(RateLimiter, backend=backend)
+    
+        @app.get("/ping")
+        async def ping():
+            return {"ok": True}
+    
+        return TestClient(app)
+    
+    def test_rejects_with_retry_after(self):
+        client = self.make_client(MemoryBackend(TokenBucket(limit=1, window=60)))
+        assert client.get("/ping").status_code == 200
+        response = client.get("/ping")
+        assert response.status_code == 429
+        assert response.json()["detail"] == "Too many requests"
+        assert int(response.headers["Retry-After"]) >= 1
+    
+    def test_fails_open_when_backend_errors(self):
+        class BrokenBackend:
+            async def hit(self, key):
+                raise ConnectionError("redis is down")
+    
+        client = self.make_client(BrokenBackend())
+        assert client.get("/ping").status_code == 200
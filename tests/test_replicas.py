@@ -0,0 +1,127 @@
+"""Tests for read replica routing, using separate SQLite files as replicas"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import SyncSessionAdapter
+from app.core.replicas import ReplicaSet, RoutingSession, primary_reads
+from app.models.user import Base, User
+from app.repositories.user_repo import UserRepository
+from app.schemas.user import UserCreate
+
+pytestmark = pytest.mark.asyncio
+
+def make_database(path, username):
+    """A SQLite file holding a single user, so reads reveal which database served them"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(User(email=f"{username}@example.com", username=username, hashed_password="x"))
+        db.commit()
+    return engine
+
+@pytest.fixture
+def databases(tmp_path):
+    primary = make_database(tmp_path / "primary.db", "on-primary")
+    replicas = [make_database(tmp_path / f"replica{i}.db", f"on-replica-{i}") for i in range(2)]
+    yield primary, replicas
+    for engine in [primary, *replicas]:
+        engine.dispose()
+
+def make_repo(primary, replica_set):
+    factory = sessionmaker(class_=RoutingSession, bind=primary, replicas=replica_set)
+    return UserRepository(SyncSessionAdapter(factory()))
+
+async def usernames(repo):
+    return {user.username for user in await repo.get_multi()}
+
+async def test_reads_go_to_a_replica(databases):
+    primary, replicas = databases
+    replica_set = ReplicaSet(replicas)
+    await replica_set.check()
+
+    assert await usernames(make_repo(primary, replica_set)) == {"on-replica-0"}
+    assert await usernames(make_repo(primary, replica_set)) == {"on-replica-1"}
+
+async def test_session_sticks_to_one_replica(databases):
+    primary, replicas = databases
+    repo = make_repo(primary, ReplicaSet(replicas))
+    assert await repo.get_by_username("on-replica-0") is not None
+    assert await repo.get_by_username("on-replica-1") is None
+
+async def test_reads_after_a_write_stay_on_the_primary(databases):
+    primary, replicas = databases
+    repo = make_repo(primary, ReplicaSet(replicas))
+    assert await usernames(repo) == {"on-replica-0"}
+
+    await repo.create(UserCreate(email="new@example.com", username="newuser", password="NewPassword123"))
+    assert await usernames(repo) == {"on-primary", "newuser"}
+
+async def test_primary_reads_block(databases):
+    primary, replicas = databases
+    repo = make_repo(primary, ReplicaSet(replicas))
+    with primary_reads(repo.db):
+        assert await usernames(repo) == {"on-primary"}
+    assert await usernames(repo) == {"on-replica-0"}
+
+async def test_cache_filling_reads_use_the_primary(databases):
+    from app.core.dependencies import get_current_user
+    from app.core.principal_cache import principal_cache
+    from app.core.security import create_access_token
+    from app.core.user_cache import user_cache
+    from app.services.user_service import UserService
+
+    primary, replicas = databases
+    replica_set = ReplicaSet(replicas)
+    user_cache.clear()
+    principal_cache.clear()
+
+    body, _ = await UserService(make_repo(primary, replica_set).db).get_user_json(1)
+    assert b"on-primary" in body
+    # The replica has no such user yet, as if the row were just created
+    token = create_access_token({"sub": "on-primary"})
+    user = await get_current_user(token, make_repo(primary, replica_set).db)
+    assert user.username == "on-primary"
+    user_cache.clear()
+    principal_cache.clear()
+
+async def test_unhealthy_replica_is_skipped(databases, tmp_path):
+    primary, replicas = databases
+    unreachable = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replica_set = ReplicaSet([unreachable, replicas[1]])
+    await replica_set.check()
+    assert [replica.healthy for replica in replica_set.replicas] == [False, True]
+
+    for _ in range(3):
+        assert await usernames(make_repo(primary, replica_set)) == {"on-replica-1"}
+
+async def test_lagging_replicas_fall_back_to_primary(databases):
+    primary, replicas = databases
+    replica_set = ReplicaSet(replicas, max_lag=5.0, lag_probe=lambda conn: 30.0)
+    await replica_set.check()
+    assert all(replica.lag == 30.0 for replica in replica_set.replicas)
+
+    assert await usernames(make_repo(primary, replica_set)) == {"on-primary"}
+
+async def test_no_replicas_reads_primary(databases):
+    primary, _ = databases
+    assert await usernames(make_repo(primary, None)) == {"on-primary"}
+
+async def test_async_session_routing(databases, tmp_path):
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica0.db'}")
+    replica_set = ReplicaSet([replica])
+    await replica_set.check()
+    factory = async_sessionmaker(
+        primary, sync_session_class=RoutingSession, expire_on_commit=False, replicas=replica_set
+    )
+    try:
+        async with factory() as session:
+            repo = UserRepository(session)
+            assert await usernames(repo) == {"on-replica-0"}
+            # Even a write that matches nothing moves later reads to the primary
+            assert await repo.delete(999) is False
+            assert await usernames(repo) == {"on-primary"}
+    finally:
+        await primary.dispose()
+        await replica.dispose()
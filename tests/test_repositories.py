@@ -1,45 +1,106 @@
-from app.repositories.user_repo import UserRepository
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.repositories.user_repo import UserRepository, unique_violation_field
 from app.schemas.user import UserCreate, UserUpdate
 
-def test_create_user(db):
-    repo = UserRepository(db)
+pytestmark = pytest.mark.asyncio
+
+async def test_create_user(session):
+    repo = UserRepository(session)
     user_create = UserCreate(
         email="repo@example.com",
         username="repouser",
         password="RepoPassword123",
         is_active=True
     )
-    user = repo.create(user_create)
+    user = await repo.create(user_create)
     assert user.id is not None
     assert user.email == "repo@example.com"
     assert user.username == "repouser"
 
-def test_get_user_by_id(db, test_user):
-    repo = UserRepository(db)
-    user = repo.get_by_id(test_user.id)
+async def test_get_user_by_id(session, test_user):
+    repo = UserRepository(session)
+    user = await repo.get_by_id(test_user.id)
     assert user is not None
     assert user.id == test_user.id
 
-def test_get_user_by_email(db, test_user):
-    repo = UserRepository(db)
-    user = repo.get_by_email("test@example.com")
+async def test_get_user_by_email(session, test_user):
+    repo = UserRepository(session)
+    user = await repo.get_by_email("test@example.com")
     assert user is not None
     assert user.email == "test@example.com"
 
-def test_get_user_by_username(db, test_user):
-    repo = UserRepository(db)
-    user = repo.get_by_username("testuser")
+async def test_get_user_by_username(session, test_user):
+    repo = UserRepository(session)
+    user = await repo.get_by_username("testuser")
     assert user is not None
     assert user.username == "testuser"
 
-def test_update_user(db, test_user):
-    repo = UserRepository(db)
+async def test_update_user(session, test_user):
+    repo = UserRepository(session)
     user_update = UserUpdate(email="newemail@example.com")
-    updated_user = repo.update(test_user, user_update)
+    updated_user = await repo.update(test_user.id, user_update)
     assert updated_user.email == "newemail@example.com"
 
-def test_delete_user(db, test_user):
-    repo = UserRepository(db)
-    repo.delete(test_user)
-    user = repo.get_by_id(test_user.id)
+async def test_delete_user(session, test_user):
+    repo = UserRepository(session)
+    user_id = test_user.id
+    assert await repo.delete(user_id) is True
+    user = await repo.get_by_id(user_id)
     assert user is None
+    assert await repo.delete(user_id) is False
+
+async def test_update_missing_user(session):
+    repo = UserRepository(session)
+    assert await repo.update(999, UserUpdate(is_active=False)) is None
+    assert await repo.update(999, UserUpdate(username="ghost")) is None
+
+async def test_create_duplicate_reports_field(session, test_user):
+    repo = UserRepository(session)
+    with pytest.raises(IntegrityError) as exc_info:
+        await repo.create(UserCreate(
+            email="other@example.com", username="testuser", password="RepoPassword123"
+        ))
+    assert unique_violation_field(exc_info.value) == "username"
+    # The session is usable again after the rollback
+    assert (await repo.get_by_username("testuser")).id == test_user.id
+
+async def test_not_null_violation_is_not_a_unique_field(session, test_user):
+    repo = UserRepository(session)
+    with pytest.raises(IntegrityError) as exc_info:
+        await repo.update(test_user.id, UserUpdate.model_construct(email=None))
+    assert unique_violation_field(exc_info.value) is None
+
+async def test_get_page_seeks_after_id(session, test_user, test_superuser):
+    repo = UserRepository(session)
+    first = await repo.get_page(limit=1)
+    assert [u.id for u in first] == [test_user.id]
+    rest = await repo.get_page(after_id=first[-1].id, limit=10)
+    assert [u.id for u in rest] == [test_superuser.id]
+
+async def test_bulk_create_reports_conflicting_rows(session, test_user):
+    repo = UserRepository(session)
+    users = [
+        UserCreate(email="bulk1@example.com", username="bulk1", password="BulkPassword1"),
+        UserCreate(email="test@example.com", username="bulk2", password="BulkPassword2"),
+        UserCreate(email="bulk3@example.com", username="bulk3", password="BulkPassword3"),
+    ]
+    assert await repo.bulk_create(users) == [1]
+    assert await repo.get_by_username("bulk1") is not None
+    assert await repo.get_by_username("bulk2") is None
+    assert await repo.get_by_username("bulk3") is not None
+
+async def test_writes_without_returning_support(session, test_user, monkeypatch):
+    dialect = session.get_bind().dialect
+    for flag in ("insert_returning", "update_returning", "delete_returning"):
+        monkeypatch.setattr(dialect, flag, False)
+    repo = UserRepository(session)
+    
+    user = await repo.create(UserCreate(
+        email="plain@example.com", username="plainuser", password="RepoPassword123"
+    ))
+    assert user.id is not None and user.username == "plainuser"
+    updated = await repo.update(user.id, UserUpdate(is_active=False))
+    assert updated.is_active is False
+    assert await repo.delete(user.id) is True
+    assert await repo.delete(user.id) is False
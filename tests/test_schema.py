@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from app.core.schema import (
+    SCHEMA_REVISION_ENV, SchemaRevisionMismatch, check_revision, head_revisions, verified_revision
+)
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    yield engine
+    engine.dispose()
+
+HEAD = ",".join(sorted(head_revisions()))
+
+def stamp(engine, revision):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("DELETE FROM alembic_version"))
+        conn.execute(text("INSERT INTO alembic_version VALUES (:revision)"), {"revision": revision})
+
+def test_check_passes_at_head(engine):
+    stamp(engine, HEAD)
+    with engine.connect() as conn:
+        assert check_revision(conn) == HEAD
+
+def test_check_fails_on_unmigrated_database(engine):
+    with engine.connect() as conn, pytest.raises(SchemaRevisionMismatch, match="no revision"):
+        check_revision(conn)
+
+def test_check_fails_on_old_revision(engine):
+    stamp(engine, "55783197bf47")
+    with engine.connect() as conn, pytest.raises(SchemaRevisionMismatch, match="55783197bf47"):
+        check_revision(conn)
+
+def test_revision_verified_by_master(monkeypatch):
+    monkeypatch.delenv(SCHEMA_REVISION_ENV, raising=False)
+    assert verified_revision() is None
+    monkeypatch.setenv(SCHEMA_REVISION_ENV, "55783197bf47")
+    assert verified_revision() is None
+    monkeypatch.setenv(SCHEMA_REVISION_ENV, HEAD)
+    assert verified_revision() == HEAD
+
+def test_head_revisions_loaded_once(monkeypatch):
+    import alembic.script
+    
+    head_revisions()
+    # A worker forked from the master compares without reading the scripts again
+    monkeypatch.setattr(alembic.script, "ScriptDirectory", None)
+    monkeypatch.setenv(SCHEMA_REVISION_ENV, HEAD)
+    assert verified_revision() == HEAD
+
+@pytest.mark.asyncio
+async def test_startup_check_skipped_when_master_verified(monkeypatch):
+    from app import main
+    
+    main.database.init_engines()
+    monkeypatch.setattr(main.settings, "DB_SCHEMA_STARTUP", "check")
+    monkeypatch.delenv(SCHEMA_REVISION_ENV, raising=False)
+    with pytest.raises(SchemaRevisionMismatch):
+        await main.prepare_schema()
+    
+    monkeypatch.setenv(SCHEMA_REVISION_ENV, HEAD)
+    await main.prepare_schema()
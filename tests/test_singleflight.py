@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from app.services.user_service import UserService, user_reads
+from app.utils.exceptions import NotFoundException
+from app.utils.singleflight import SingleFlight
+
+def slow_call(calls, result="value", error=None):
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+    results = await asyncio.gather(*(flight.do("key", slow_call(calls)) for _ in range(5)))
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.stats == {"leaders": 1, "shared": 4}
+
+@pytest.mark.asyncio
+async def test_nothing_kept_after_completion():
+    flight = SingleFlight("test")
+    calls = []
+    await flight.do("key", slow_call(calls))
+    await flight.do("key", slow_call(calls))
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    calls = []
+    await asyncio.gather(flight.do("a", slow_call(calls)), flight.do("b", slow_call(calls)))
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_error_is_shared():
+    flight = SingleFlight("test")
+    calls = []
+    results = await asyncio.gather(
+        *(flight.do("key", slow_call(calls, error=LookupError("gone"))) for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, LookupError) for result in results)
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_followers_retry_when_leader_is_cancelled():
+    flight = SingleFlight("test")
+    calls = []
+    leader = asyncio.ensure_future(flight.do("key", slow_call(calls)))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("key", slow_call(calls, result="retried")))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == "retried"
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_disabled_runs_every_call():
+    flight = SingleFlight("test", enabled=False)
+    calls = []
+    await asyncio.gather(*(flight.do("key", slow_call(calls)) for _ in range(3)))
+    assert len(calls) == 3
+
+@pytest.mark.asyncio
+async def test_concurrent_user_reads_coalesce(session, test_user):
+    shared = user_reads.stats["shared"]
+    results = await asyncio.gather(*(UserService(session).get_user_json(test_user.id) for _ in range(5)))
+    assert len({body for body, _ in results}) == 1
+    assert user_reads.stats["shared"] == shared + 4
+    
+    with pytest.raises(NotFoundException):
+        await asyncio.gather(*(UserService(session).get_user_json(999) for _ in range(3)))
@@ -0,0 +1,60 @@
+"""Tests for streaming parse helpers"""
+import pytest
+from app.utils.streaming import iter_lines, iter_ndjson_records, iter_csv_records
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+@pytest.mark.asyncio
+class TestStreamingParsers:
+    """Test incremental line and record parsing"""
+    
+    async def test_lines_split_across_chunks(self):
+        """Test lines are reassembled whatever the chunk boundaries"""
+        data = b"first\r\nsecond\nthird"
+        assert await collect(iter_lines(chunked(data, 3))) == ["first", "second", "third"]
+    
+    async def test_ndjson_records(self):
+        """Test NDJSON parsing reports bad lines by row number"""
+        data = b'{"a": 1}\n\n[1]\n{bad\n{"b": 2}\n'
+        records = await collect(iter_ndjson_records(chunked(data, 4)))
+        assert records == [
+            (1, {"a": 1}),
+            (2, "Expected a JSON object"),
+            (3, "Invalid JSON"),
+            (4, {"b": 2}),
+        ]
+    
+    async def test_csv_records(self):
+        """Test CSV parsing uses the header and drops empty cells"""
+        data = b'email,username\n"a@example.com",alice\nb@example.com,\n'
+        records = await collect(iter_csv_records(chunked(data, 5)))
+        assert records == [
+            (1, {"email": "a@example.com", "username": "alice"}),
+            (2, {"email": "b@example.com"}),
+        ]
+    
+    async def test_overlong_lines_are_skipped(self):
+        """Test a line over the limit is reported once and parsing resumes after it"""
+        data = b"short\n" + b"x" * 50 + b"\nafter\n" + b"y" * 50
+        assert await collect(iter_lines(chunked(data, 7), max_line_bytes=10)) == ["short", None, "after", None]
+    
+    async def test_overlong_records_reported_as_errors(self):
+        """Test NDJSON and CSV report overlong lines as row errors"""
+        data = b'{"a": 1}\n{"padding": "' + b"x" * 100 + b'"}\n{"b": 2}\n'
+        records = await collect(iter_ndjson_records(chunked(data, 16), max_line_bytes=32))
+        assert records == [(1, {"a": 1}), (2, "Line longer than 32 bytes"), (3, {"b": 2})]
+        
+        data = b"email,username\n" + b"a" * 100 + b",alice\nb@example.com,bob\n"
+        records = await collect(iter_csv_records(chunked(data, 16), max_line_bytes=32))
+        assert records == [(1, "Line longer than 32 bytes"), (2, {"email": "b@example.com", "username": "bob"})]
+        
+        records = await collect(iter_csv_records(chunked(b"x" * 100, 16), max_line_bytes=32))
+        assert records == [(1, "Header line longer than 32 bytes")]
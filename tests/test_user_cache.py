@@ -0,0 +1,161 @@
+import asyncio
+import time
+import pytest
+from app.core.redis import FakeRedis
+from app.core.user_cache import UserCache, user_cache
+
+def counting_loader(calls, body=b'{"id": 1}', etag='"1-0"', delay=0.0):
+    async def load():
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return body, etag
+    return load
+
+@pytest.mark.asyncio
+async def test_hit_after_miss():
+    cache = UserCache(FakeRedis(), ttl=60)
+    calls = []
+    assert await cache.get_user(1, counting_loader(calls)) == (b'{"id": 1}', '"1-0"')
+    assert await cache.get_user(1, counting_loader(calls)) == (b'{"id": 1}', '"1-0"')
+    assert len(calls) == 1
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    cache = UserCache(FakeRedis(), ttl=60, lock_timeout=1.0)
+    calls = []
+    results = await asyncio.gather(*(cache.get_user(1, counting_loader(calls, delay=0.05)) for _ in range(10)))
+    assert len(calls) == 1
+    assert all(result == results[0] for result in results)
+    assert cache.stats["lock_waits"] == 9
+
+@pytest.mark.asyncio
+async def test_entry_refreshed_ahead_of_expiry(monkeypatch):
+    cache = UserCache(FakeRedis(), ttl=60, refresh_ahead=5)
+    calls = []
+    await cache.get_user(1, counting_loader(calls, body=b"old"))
+
+    later = time.time() + 56
+    monkeypatch.setattr(time, "time", lambda: later)
+    # One request reloads; the entry is still there for everyone else meanwhile
+    assert await cache.get_user(1, counting_loader(calls, body=b"new")) == (b"new", '"1-0"')
+    assert cache.stats["refreshes"] == 1
+    assert await cache.get_user(1, counting_loader(calls)) == (b"new", '"1-0"')
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_user_and_list_pages():
+    cache = UserCache(FakeRedis(), ttl=60)
+    calls = []
+    await cache.get_user(1, counting_loader(calls))
+    await cache.get_list(0, 100, counting_loader(calls, body=b"[]"))
+    await cache.invalidate(1)
+
+    await cache.get_user(1, counting_loader(calls))
+    await cache.get_list(0, 100, counting_loader(calls, body=b"[]"))
+    assert len(calls) == 4
+
+@pytest.mark.asyncio
+async def test_load_overtaken_by_update_is_not_served():
+    cache = UserCache(FakeRedis(), ttl=60)
+    loading, updated = asyncio.Event(), asyncio.Event()
+
+    async def slow_load():
+        # Reads the row, then the update commits and invalidates before it is stored
+        loading.set()
+        await updated.wait()
+        return b"old", '"1-0"'
+
+    async def update():
+        await loading.wait()
+        await cache.invalidate(1)
+        updated.set()
+
+    results = await asyncio.gather(cache.get_user(1, slow_load), update())
+    assert results[0] == (b"old", '"1-0"')
+    calls = []
+    assert await cache.get_user(1, counting_loader(calls, body=b"new")) == (b"new", '"1-0"')
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_disabled_cache_always_loads():
+    cache = UserCache(FakeRedis(), enabled=False)
+    calls = []
+    await cache.get_user(1, counting_loader(calls))
+    await cache.get_user(1, counting_loader(calls))
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_falls_back_to_loader():
+    class BrokenRedis(FakeRedis):
+        async def get(self, name):
+            raise ConnectionError("redis is down")
+
+    cache = UserCache(BrokenRedis())
+    calls = []
+    assert await cache.get_user(1, counting_loader(calls)) == (b'{"id": 1}', '"1-0"')
+    assert await cache.get_list(0, 100, counting_loader(calls)) == (b'{"id": 1}', '"1-0"')
+    await cache.invalidate(1)
+    assert len(calls) == 2
+
+def test_read_user_served_from_cache(client, superuser_token, test_user):
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    first = client.get(f"/api/v1/users/{test_user.id}", headers=headers)
+    hits = user_cache.stats["hits"]
+    second = client.get(f"/api/v1/users/{test_user.id}", headers=headers)
+
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+    assert user_cache.stats["hits"] == hits + 1
+
+def test_writes_invalidate_cached_reads(client, superuser_token, test_user):
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    user_id = test_user.id
+    assert client.get(f"/api/v1/users/{user_id}", headers=headers).json()["username"] == "testuser"
+    assert len(client.get("/api/v1/users/", headers=headers).json()) == 2
+
+    client.put(f"/api/v1/users/{user_id}", headers=headers, json={"username": "renamed"})
+    assert client.get(f"/api/v1/users/{user_id}", headers=headers).json()["username"] == "renamed"
+
+    client.post("/api/v1/users/", json={
+        "email": "new@example.com", "username": "newuser", "password": "Password123"
+    })
+    assert len(client.get("/api/v1/users/", headers=headers).json()) == 3
+
+    client.delete(f"/api/v1/users/{user_id}", headers=headers)
+    assert client.get(f"/api/v1/users/{user_id}", headers=headers).status_code == 404
+    assert len(client.get("/api/v1/users/", headers=headers).json()) == 2
+
+@pytest.mark.asyncio
+async def test_loader_error_propagates_without_retry(caplog):
+    cache = UserCache(FakeRedis())
+    calls = []
+
+    async def missing():
+        calls.append(1)
+        raise LookupError("no such user")
+
+    with pytest.raises(LookupError):
+        await cache.get_user(1, missing)
+    assert len(calls) == 1
+    assert "User cache" not in caplog.text
+    # The load lock was released, so the next miss loads straight away
+    assert await cache.get_user(1, counting_loader(calls)) == (b'{"id": 1}', '"1-0"')
+
+def test_missing_user_queried_once(client, superuser_token, monkeypatch):
+    from app.repositories.user_repo import UserRepository
+
+    calls = []
+    original = UserRepository._load_batch
+
+    async def counting_batch(self, user_ids):
+        calls.append(user_ids)
+        return await original(self, user_ids)
+
+    monkeypatch.setattr(UserRepository, "_load_batch", counting_batch)
+    response = client.get("/api/v1/users/9999", headers={"Authorization": f"Bearer {superuser_token}"})
+    assert response.status_code == 404
+    assert calls == [[9999]]
@@ -1,3 +1,6 @@
+from datetime import datetime
+from app.core.config import settings
+
 def test_create_user(client):
     response = client.post(
         "/api/v1/users/",
@@ -163,3 +166,401 @@ def test_create_user_with_harmful_chars_in_username(client):
     assert "<" not in data["username"]
     assert ">" not in data["username"]
     assert data["username"] == "userscriptname"
+
+
+def test_read_users_page_with_cursor(client, db, superuser_token, test_user):
+    from app.models.user import User
+    for i in range(3):
+        db.add(User(email=f"page{i}@example.com", username=f"page{i}", hashed_password="x"))
+    db.commit()
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/users/page", headers=headers, params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= 2
+        seen.extend(item["id"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+def test_read_users_page_invalid_cursor(client, superuser_token):
+    response = client.get(
+        "/api/v1/users/page",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        params={"cursor": "not-a-cursor"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_read_users_page_enforces_max_size(client, superuser_token):
+    response = client.get(
+        "/api/v1/users/page",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        params={"limit": 10_000}
+    )
+    assert response.status_code == 422
+
+
+def test_import_users_ndjson(client, superuser_token, test_user):
+    body = "\n".join([
+        '{"email": "bulk1@example.com", "username": "bulk1", "password": "BulkPassword1"}',
+        '{"email": "bulk2@example.com", "username": "bulk2", "password": "BulkPassword2", "is_active": false}',
+        'not json',
+        '{"email": "test@example.com", "username": "taken", "password": "BulkPassword3"}',
+        '{"email": "bulk3@example.com", "username": "bulk1", "password": "BulkPassword4"}',
+        '{"email": "bulk4@example.com", "username": "bulk4", "password": "weak"}',
+        '',
+    ])
+    response = client.post(
+        "/api/v1/users/import",
+        headers={
+            "Authorization": f"Bearer {superuser_token}",
+            "Content-Type": "application/x-ndjson",
+        },
+        content=body
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 2
+    assert report["failed"] == 4
+    errors = {error["row"]: error["errors"] for error in report["errors"]}
+    assert errors[3] == ["Invalid JSON"]
+    assert errors[4] == ["Email already registered"]
+    assert errors[5] == ["Username already taken"]
+    assert errors[6][0].startswith("password:")
+    
+    login = client.post(
+        "/api/v1/auth/login",
+        data={"username": "bulk1", "password": "BulkPassword1"}
+    )
+    assert login.status_code == 200
+
+def test_import_users_reports_overlong_lines(client, superuser_token, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_IMPORT_MAX_LINE_BYTES", 200)
+    body = "\n".join([
+        '{"email": "long@example.com", "username": "' + "x" * 500 + '", "password": "BulkPassword1"}',
+        '{"email": "bulk1@example.com", "username": "bulk1", "password": "BulkPassword1"}',
+    ])
+    response = client.post(
+        "/api/v1/users/import",
+        headers={"Authorization": f"Bearer {superuser_token}", "Content-Type": "application/x-ndjson"},
+        content=body
+    )
+    report = response.json()
+    assert report["created"] == 1
+    assert report["errors"] == [{"row": 1, "errors": ["Line longer than 200 bytes"]}]
+
+def test_import_users_csv(client, superuser_token):
+    body = (
+        "email,username,password,is_active\r\n"
+        "csv1@example.com,csv1,CsvPassword1,true\r\n"
+        "csv2@example.com,csv2,CsvPassword2,\r\n"
+        "csv3@example.com,csv3\r\n"
+    )
+    response = client.post(
+        "/api/v1/users/import",
+        headers={
+            "Authorization": f"Bearer {superuser_token}",
+            "Content-Type": "text/csv",
+        },
+        content=body
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 2
+    assert report["errors"] == [{"row": 3, "errors": ["Expected 4 columns, got 2"]}]
+
+def test_import_users_unsupported_content_type(client, superuser_token):
+    response = client.post(
+        "/api/v1/users/import",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        json=[]
+    )
+    assert response.status_code == 400
+
+def test_import_users_as_regular_user(client, user_token):
+    response = client.post(
+        "/api/v1/users/import",
+        headers={
+            "Authorization": f"Bearer {user_token}",
+            "Content-Type": "application/x-ndjson",
+        },
+        content=""
+    )
+    assert response.status_code == 403
+
+
+def test_export_users_ndjson(client, test_user, superuser_token):
+    import json
+    response = client.get(
+        "/api/v1/users/export",
+        headers={"Authorization": f"Bearer {superuser_token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["username"] for row in rows] == ["testuser", "admin"]
+    assert "hashed_password" not in rows[0]
+
+def test_export_users_csv(client, test_user, superuser_token):
+    response = client.get(
+        "/api/v1/users/export",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        params={"format": "csv"}
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "email,username,is_active,id,is_superuser,created_at"
+    assert lines[1].startswith("test@example.com,testuser,True,")
+    assert len(lines) == 3
+
+def test_export_users_as_regular_user(client, user_token):
+    response = client.get(
+        "/api/v1/users/export",
+        headers={"Authorization": f"Bearer {user_token}"}
+    )
+    assert response.status_code == 403
+
+def test_read_users_serializes_datetimes_as_iso(client, superuser_token, test_user):
+    response = client.get(
+        "/api/v1/users/",
+        headers={"Authorization": f"Bearer {superuser_token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    created_at = {user["username"]: user["created_at"] for user in response.json()}["testuser"]
+    assert datetime.fromisoformat(created_at) == test_user.created_at.replace(tzinfo=None)
+    assert "hashed_password" not in response.json()[0]
+
+def test_user_response_schema_documents_email_format(client):
+    schema = client.get("/openapi.json").json()["components"]["schemas"]["UserResponse"]
+    assert schema["properties"]["email"]["format"] == "email"
+
+def test_update_user_duplicate_email(client, superuser_token, test_user, test_superuser):
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        json={"email": "admin@example.com"}
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Email already registered"
+
+def test_update_user_rejects_null_fields(client, superuser_token, test_user):
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    for field in ("email", "username", "password", "is_active"):
+        response = client.put(f"/api/v1/users/{test_user.id}", headers=headers, json={field: None})
+        assert response.status_code == 422, field
+
+def test_non_unique_integrity_error_is_not_a_conflict():
+    from sqlalchemy.exc import IntegrityError
+    from app.services.user_service import _integrity_error
+    
+    not_null = IntegrityError("UPDATE users", {}, Exception("NOT NULL constraint failed: users.email"))
+    assert _integrity_error(not_null).status_code == 422
+    unique = IntegrityError("UPDATE users", {}, Exception("UNIQUE constraint failed: users.email"))
+    assert _integrity_error(unique).status_code == 409
+
+def test_update_missing_user(client, superuser_token):
+    response = client.put(
+        "/api/v1/users/999",
+        headers={"Authorization": f"Bearer {superuser_token}"},
+        json={"is_active": False}
+    )
+    assert response.status_code == 404
+
+def test_delete_missing_user(client, superuser_token):
+    response = client.delete(
+        "/api/v1/users/999",
+        headers={"Authorization": f"Bearer {superuser_token}"}
+    )
+    assert response.status_code == 404
+
+def test_read_current_user_not_modified(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    response = client.get("/api/v1/users/me", headers=headers)
+    etag = response.headers["ETag"]
+    
+    response = client.get("/api/v1/users/me", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+def test_read_user_etag_changes_on_update(client, user_token, test_user):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    etag = client.get(f"/api/v1/users/{test_user.id}", headers=headers).headers["ETag"]
+    assert client.get(
+        f"/api/v1/users/{test_user.id}", headers={**headers, "If-None-Match": etag}
+    ).status_code == 304
+    
+    response = client.put(f"/api/v1/users/{test_user.id}", headers=headers, json={"is_active": True})
+    assert response.headers["ETag"] != etag
+    response = client.get(f"/api/v1/users/{test_user.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+
+def test_update_user_if_match(client, user_token, test_user):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    etag = client.get(f"/api/v1/users/{test_user.id}", headers=headers).headers["ETag"]
+    
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={**headers, "If-Match": etag},
+        json={"email": "first@example.com"}
+    )
+    assert response.status_code == 200
+    
+    # A second writer still holding the old ETag is rejected
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={**headers, "If-Match": etag},
+        json={"email": "second@example.com"}
+    )
+    assert response.status_code == 412
+    assert client.get(f"/api/v1/users/{test_user.id}", headers=headers).json()["email"] == "first@example.com"
+
+def test_update_user_if_match_with_zero_timestamp(client, user_token, test_user):
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={"Authorization": f"Bearer {user_token}", "If-Match": f'"{test_user.id}-0"'},
+        json={"is_active": False}
+    )
+    assert response.status_code == 412
+
+def test_update_user_if_match_with_oversized_timestamp(client, user_token, test_user):
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={"Authorization": f"Bearer {user_token}", "If-Match": f'"{test_user.id}-ffffffffffffffffffff"'},
+        json={"is_active": False}
+    )
+    assert response.status_code == 412
+
+def test_update_user_if_match_for_other_user(client, superuser_token, test_user, test_superuser):
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    etag = client.get(f"/api/v1/users/{test_superuser.id}", headers=headers).headers["ETag"]
+    response = client.put(
+        f"/api/v1/users/{test_user.id}",
+        headers={**headers, "If-Match": etag},
+        json={"is_active": False}
+    )
+    assert response.status_code == 412
+
+def test_read_users_batch_keeps_request_order(client, user_token, test_user, test_superuser):
+    ids = f"{test_superuser.id},999,{test_user.id},{test_superuser.id}"
+    response = client.get(
+        "/api/v1/users/batch", params={"ids": ids}, headers={"Authorization": f"Bearer {user_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [user and user["username"] for user in data] == ["admin", None, "testuser", "admin"]
+
+def test_read_users_batch_rejects_bad_ids(client, user_token, monkeypatch):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/api/v1/users/batch?ids=1,x", headers=headers).status_code == 400
+    
+    monkeypatch.setattr(settings, "MAX_BATCH_IDS", 2)
+    response = client.get("/api/v1/users/batch?ids=1,2,3", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "At most 2 ids per request"
+
+def _search(client, token, **params):
+    return client.get("/api/v1/users/search", headers={"Authorization": f"Bearer {token}"}, params=params)
+
+def test_search_users_ranks_matches(client, db, superuser_token, test_user):
+    from app.models.user import User
+    db.add_all([
+        User(email="ann@example.com", username="joann", hashed_password="x"),
+        User(email="annabel@example.com", username="bel", hashed_password="x"),
+        User(email="zed@example.com", username="Annika", hashed_password="x"),
+        User(email="x@example.com", username="ann", hashed_password="x"),
+    ])
+    db.commit()
+    
+    response = _search(client, superuser_token, q="ANN")
+    assert response.status_code == 200
+    # exact, username prefix, email prefix (by id), substring
+    assert [item["username"] for item in response.json()["items"]] == ["ann", "Annika", "joann", "bel"]
+
+def test_search_users_paginates(client, db, superuser_token):
+    from app.models.user import User
+    for i in range(5):
+        db.add(User(email=f"find{i}@example.com", username=f"xfind{i}", hashed_password="x"))
+    db.commit()
+    
+    seen, cursor = [], None
+    while True:
+        params = {"q": "find", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        data = _search(client, superuser_token, **params).json()
+        seen.extend(item["username"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == [f"xfind{i}" for i in range(5)]
+    assert len(seen) == 5
+    
+    response = _search(client, superuser_token, q="other", cursor=data["next_cursor"] or "bad")
+    assert response.status_code == 400
+
+def test_search_users_short_query_matches_prefix_only(client, superuser_token, test_user):
+    # "es" is inside "testuser" but no username or email starts with it
+    assert _search(client, superuser_token, q="es").json()["items"] == []
+    assert [item["username"] for item in _search(client, superuser_token, q="te").json()["items"]] == ["testuser"]
+
+def test_search_users_escapes_wildcards(client, superuser_token, test_user):
+    assert _search(client, superuser_token, q="%").json()["items"] == []
+    assert _search(client, superuser_token, q="t_st").json()["items"] == []
+
+def test_search_users_as_regular_user(client, user_token):
+    assert _search(client, user_token, q="test").status_code == 403
+
+def test_search_indexes_compile_for_postgres():
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex
+    from app.models.user import User
+    
+    indexes = {index.name: str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+               for index in User.__table__.indexes}
+    assert "USING gin (lower(username) gin_trgm_ops)" in indexes["ix_users_username_trgm"]
+    assert "(lower(email) text_pattern_ops)" in indexes["ix_users_email_prefix"]
+
+def test_read_users_total_count(client, superuser_token, test_user):
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    assert "X-Total-Count" not in client.get("/api/v1/users/", headers=headers).headers
+    
+    for mode in ("exact", "estimated"):
+        response = client.get("/api/v1/users/", headers=headers, params={"total": mode})
+        assert response.headers["X-Total-Count"] == "2"
+    
+    response = client.get("/api/v1/users/page", headers=headers, params={"total": "exact", "limit": 1})
+    assert response.json()["total"] == 2
+    assert response.headers["X-Total-Count"] == "2"
+    assert client.get("/api/v1/users/page", headers=headers).json()["total"] is None
+
+def test_total_count_cached_until_create_or_delete(client, db, superuser_token, test_user):
+    from app.models.user import User
+    headers = {"Authorization": f"Bearer {superuser_token}"}
+    
+    def total():
+        return client.get("/api/v1/users/", headers=headers, params={"total": "exact"}).headers["X-Total-Count"]
+    
+    assert total() == "2"
+    # Written behind the repository's back: the cached count is kept
+    db.add(User(email="direct@example.com", username="direct", hashed_password="x"))
+    db.commit()
+    assert total() == "2"
+    
+    client.post("/api/v1/users/", json={
+        "email": "counted@example.com", "username": "counted", "password": "Str0ngPassw0rd!"
+    })
+    assert total() == "4"
+    assert client.delete(f"/api/v1/users/{test_user.id}", headers=headers).status_code == 204
+    assert total() == "3"